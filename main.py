@@ -28,6 +28,13 @@ import argparse
 from pathlib import Path 
 import os 
 
+def positive_int(value):
+    """argparse type for intervals in minutes. 0 or negative intervals would divide by zero during the run"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a whole number of at least 1")
+    return number 
+
 # Create the parser
 parser = argparse.ArgumentParser(description='Command Line Argument Parser for Simulation')
 
@@ -43,6 +50,23 @@ parser.add_argument('-t', "--time", required=False, type=int, default=60, help='
 # Add the -v and -a flags for enabling/disabling visualizer and analytics
 parser.add_argument('-v', "--visualizer", required=False, action="store_true", help='Enable the visualizer')
 parser.add_argument('-a', "--analytics", required=False, action="store_true", help="Enable the analytics output")
+parser.add_argument('-e', "--elastic", required=False, type=str, default=None, help="Elasticsearch URL (e.g. http://localhost:9200). If supplied, the analytics output is sent to Elasticsearch with the bulk API instead of mdx_elk.json")
+parser.add_argument('-b', "--binary", required=False, type=str, default=None, help="Write the analytics output to this file in the compact binary format instead of mdx_elk.json. Convert it with python3 -m sim2d.wire2D")
+parser.add_argument('-s', "--seed", required=False, type=int, default=None, help="Seed for the analytics record ids. Runs with the same seed produce the same ids")
+parser.add_argument("--watchdog", required=False, action="store_true", help="Print a warning when a process inventory keeps growing during the run")
+parser.add_argument('-k', "--kpi", required=False, type=str, default=None, help="Write a KPI summary (throughput, queue lengths, mover utilization, dwell times) to this JSON file. Use without -a to skip the detection output")
+parser.add_argument("--kpi_interval", required=False, type=positive_int, default=None, help="Also write the KPI summary every this many minutes while the simulation runs")
+parser.add_argument("--rollups", required=False, type=positive_int, nargs='+', default=[], help="Also write mdx-rollup indices with occupancy of every camera and ROI per window of this many minutes (e.g. --rollups 1 15)")
+parser.add_argument("--heatmap", required=False, type=str, default=None, help="Accumulate occupancy and flow heatmaps and save them as <prefix>.npz and <prefix>_<type>.png at the end of the run")
+parser.add_argument("--heatmap_interval", required=False, type=positive_int, default=None, help="Also save a heatmap snapshot every this many minutes")
+parser.add_argument("--shm", required=False, type=str, default=None, help="Publish the state of every timestep to a shared memory ring buffer with this name for consumers in other processes")
+parser.add_argument("--steady", required=False, action="store_true", help="Simulate without output until inventory levels and throughput reach steady state, then generate -t minutes")
+parser.add_argument("--steady_max", required=False, type=int, default=360, help="Maximum number of minutes simulated to reach steady state")
+parser.add_argument("--steady_window", required=False, type=positive_int, default=10, help="Minutes per batch compared by the steady state detector. Should cover the longest cycle of the scene. Steady state is found after 4 batches at the earliest")
+parser.add_argument("--snapshot", required=False, type=str, default=None, help="Warm up like --steady and save the steady state to this file so later runs can start from it with --from_snapshot")
+parser.add_argument("--from_snapshot", required=False, type=str, default=None, help="Start from a state saved with --snapshot instead of an empty scene. Runs with different -s seeds diverge from the same state")
+parser.add_argument("--reload", required=False, action="store_true", help="Watch the diagram and yaml file and apply changes to the running scene without restarting")
+parser.add_argument('-r', "--resolution", required=False, type=int, nargs=2, default=[1920, 1080], help="Width and height in pixels of the camera images used for object bounding boxes")
 
 args = parser.parse_args()
 print(args)
@@ -72,12 +96,46 @@ if not yaml_path:
 
 #Load starting state
 starting_state = state_from_files(diagram_path, yaml_path)
+if args.from_snapshot:
+    from sim2d.steady2D import load_snapshot, fork
+    sim = fork(load_snapshot(args.from_snapshot), seed=args.seed) #skips the warm-up 
+    starting_state = sim.state 
+else:
+    sim = Simulator2D(starting_state) #simulator: moves objects and handle item production 
+
+if (args.steady or args.snapshot) and not args.from_snapshot:
+    from sim2d.steady2D import SteadyStateDetector, warm_up, take_snapshot, save_snapshot
+    warm_up(sim, SteadyStateDetector(window=args.steady_window * 60), max_steps=args.steady_max * 60) #no output during the warm-up 
+    if args.snapshot:
+        save_snapshot(take_snapshot(sim), args.snapshot)
+        print(f"Saved the steady state to {args.snapshot}")
 
 #Adjust start time so the end of the simulation will be the current time when the script is run 
 start_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=timesteps)
 
 #Instantiate simulation compoenents 
-sim = Simulator2D(starting_state) #simulator: moves objects and handle item production 
+if args.watchdog:
+    from sim2d.watchdog2D import MemoryWatchdog
+    sim.add_observer(MemoryWatchdog()) #warns about items that pile up in inventories 
+
+if args.kpi:
+    from sim2d.kpi2D import KPIAggregator
+    kpi = KPIAggregator(args.kpi, interval=args.kpi_interval * 60 if args.kpi_interval else None)
+    sim.add_observer(kpi) #keeps running KPIs without storing detection records 
+
+if args.shm:
+    from sim2d.shm2D import ShmPublisher
+    publisher = ShmPublisher(args.shm)
+    sim.add_observer(publisher) #consumers read the state with sim2d.shm2D.ShmReader 
+
+if args.heatmap:
+    from sim2d.heatmap2D import Heatmap2D
+    heatmap = Heatmap2D(starting_state.width, starting_state.height, output_prefix=args.heatmap, interval=args.heatmap_interval * 60 if args.heatmap_interval else None)
+    sim.add_observer(heatmap) #occupancy and flow grids for layout reviews 
+
+if args.reload:
+    from sim2d.reload2D import HotReload
+    reloader = HotReload(sim, diagram_path, yaml_path) #applies edits of the scene files between timesteps 
 
 if enable_visualizer:
     from sim2d.visualizer2D import Visualizer2D_PyGame
@@ -85,15 +143,39 @@ if enable_visualizer:
 
 if enable_anlytics:
     from sim2d.analytics2D import Analytics2D
-    analyze = Analytics2D("mdx_elk.json", timestamp=start_time) #analytics: generates detection data as an ELK dump
-
-for i in range(timesteps):
-    new_state = sim.timestep() #step simulator 
+    sink = None #default writes mdx_elk.json 
+    if args.elastic:
+        from sim2d.sinks import ElasticsearchBulkSink
+        sink = ElasticsearchBulkSink(args.elastic)
+    elif args.binary:
+        from sim2d.wire2D import BinarySink
+        sink = BinarySink(args.binary)
+    from sim2d.noise2D import SensorNoise
+    noise = SensorNoise.from_yaml(yaml_path, seed=args.seed) #optional detection noise from the yaml 
+    analyze = Analytics2D("mdx_elk.json", timestamp=start_time, resolution=tuple(args.resolution), seed=args.seed, sink=sink, rollups=[minutes * 60 for minutes in args.rollups], noise=noise) #analytics: generates detection data as an ELK dump
+
+for i, new_state in enumerate(sim.run(timesteps)): #step simulator 
     if enable_anlytics:
         analyze(new_state, i) #generate analytics and write out ELK dump 
     if enable_visualizer:
         vis(new_state) #visualize a simulator state 
     #sleep(0.01)
+    if args.reload:
+        reloader(new_state, i)
 
     if i % 60 == 0:
-        print(f"{i//60} minutes have been generated")
\ No newline at end of file
+        print(f"{i//60} minutes have been generated")
+
+if enable_anlytics:
+    analyze.close() #write out remaining behavior tracks
+
+if args.kpi:
+    kpi.close() #write the final KPI summary 
+    print(f"Wrote KPI summary to {args.kpi}")
+
+if args.shm:
+    publisher.close() #remove the shared memory 
+
+if args.heatmap:
+    heatmap.close() #save the final heatmaps 
+    print(f"Wrote heatmaps to {args.heatmap}.npz") 
\ No newline at end of file
@@ -19,23 +19,158 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import calendar 
 import datetime 
 import uuid 
+import math 
+import random 
+from itertools import count 
+import numpy as np 
+from collections import Counter
+from dataclasses import dataclass, replace 
 from .mdx_schema import *
+from .tracker2D import Tracker2D, segment_crossings
+from .sinks import FileSink
+from .scheduler2D import sample_times
+
+class BehaviorTrack:
+    """Trajectory of one object inside one camera. Memory is bounded by max_locations."""
+
+    def __init__(self, sensor_id, obj_type, timestamp, frame, x, y):
+        self.sensor_id = sensor_id
+        self.type = obj_type
+        self.start = timestamp
+        self.end = timestamp
+        self.start_frame = frame
+        self.end_frame = frame 
+        self.locations = [[x, y]]
+        self.distance = 0.0
+
+    def update(self, timestamp, frame, x, y, step):
+        self.end = timestamp
+        self.end_frame = frame 
+        self.locations.append([x, y])
+        self.distance += step 
+
+class Rollup:
+    """Occupancy of one camera or ROI over a time window, accumulated one frame at a time"""
+
+    def __init__(self, sensor_id, roi_id=None):
+        self.sensor_id = sensor_id
+        self.roi_id = roi_id 
+        self.frames = 0
+        self.sums = Counter() #type -> sum of counts over frames 
+        self.max = Counter() #type -> max count in a frame 
+        self.min = {} #type -> min count over the frames the type was seen in 
+        self.seen = Counter() #type -> frames the type was seen in 
+        self.ids = {} #type -> unique object ids 
+
+    def add(self, ids, types):
+        self.frames += 1
+        for type, count in Counter(types).items():
+            self.sums[type] += count 
+            self.max[type] = max(self.max[type], count)
+            self.min[type] = min(self.min.get(type, count), count)
+            self.seen[type] += 1
+        for gid, type in zip(ids, types):
+            self.ids.setdefault(type, set()).add(gid)
+
+    def counts(self):
+        """Min, max, mean and unique objects of each type. Frames without the type count as 0"""
+        counts = []
+        for type in self.sums:
+            minimum = self.min[type] if self.seen[type] == self.frames else 0
+            counts.append(rollup_count_pyd(type=type, min=minimum, max=self.max[type], mean=self.sums[type] / self.frames, unique=len(self.ids[type])))
+        return counts 
+
+class RecordIds:
+    """Fast, collision free and reproducible record ids. 
+    
+    Ids are formatted as UUIDs made of a prefix drawn from a seeded random generator and a 48 bit counter.
+    """
+
+    def __init__(self, seed=None):
+        rng = random.Random(seed)
+        self.prefix = str(uuid.UUID(int=rng.getrandbits(128)))[:24] #first 4 groups of the uuid 
+        self.counter = count()
+
+    def __call__(self):
+        return f"{self.prefix}{next(self.counter):012x}"
+
+@dataclass
+class DetectionBatch:
+    """Detections of one camera in one frame stored as arrays"""
+    ids: list
+    types: list
+    boxes: np.ndarray #(N,4) leftX, topY, rightX, bottomY in camera pixel coordinates 
+    speed: np.ndarray #(N,) distance per second 
+    direction: np.ndarray #(N,2) unit vector of the motion direction 
+    confidence: np.ndarray #(N,)
+
+    def objects(self):
+        """Convert the batch to a list of mdx objects"""
+        boxes = self.boxes.tolist()
+        speed = self.speed.tolist()
+        direction = self.direction.tolist()
+        confidence = self.confidence.tolist()
+
+        objects = []
+        for i, (gid, type) in enumerate(zip(self.ids, self.types)):
+            left, top, right, bottom = boxes[i]
+            box = bbox_pyd(leftX=left, bottomY=bottom, topY=top, rightX=right)
+            objects.append(object_pyd(bbox=box, id=gid, type=type, confidence=confidence[i], dir=direction[i], speed=speed[i]))
+        return objects 
+
+@dataclass
+class CameraFrame:
+    """One frame of a camera. Frames between timesteps have interpolated positions"""
+    camera: object
+    frame_id: str
+    timestamp: str
+    batch: DetectionBatch
+    rois: list #(roi, [(id, type, x, y) of each object in the roi])
+
+def _inside(points, bbox):
+    """Mask of the points (...,2) that are inside the x1,y1,x2,y2 rectangle"""
+    x1, y1, x2, y2 = bbox 
+    return (points[..., 0] >= x1) & (points[..., 0] <= x2) & (points[..., 1] >= y1) & (points[..., 1] <= y2)
 
 class Analytics2D:
 
     """Generates detection metadata in ELK Dump format that is compatible with MDX APIs"""
 
-    def __init__(self, output_file, timestamp=datetime.datetime.utcnow(), place="city=Austin/building=Office/room=Cafeteria"):
+    def __init__(self, output_file, timestamp=datetime.datetime.utcnow(), place="city=Austin/building=Office/room=Cafeteria", behavior=True, max_track_length=300, resolution=(1920, 1080), seed=None, sink=None, rollups=(), noise=None):
 
         self.frame_count = 0
         self.index_file = output_file
         self.timestamp = timestamp
         self.place = place
+        self.resolution = resolution #width, height of every camera image in pixels 
+        self.record_id = RecordIds(seed)
+
+        #Constants shared by every record of a timestep. Set by _start_tick 
+        self.tick_timestamp = self.timestamp_formatted
+        self.tick_frame_id = str(self.frame_count)
+        self.tick_date = None 
+        self.tick_index = {}
+        self.tick_timestamps = {} #fraction of the timestep -> timestamp of frames between timesteps 
+
+        #Object tracking for tripwire and behavior output 
+        self.tracker = Tracker2D()
+        self.behavior = behavior
+        self.max_track_length = max_track_length #max locations held per behavior record 
+        self.tracks = {} #camera id -> {object id: BehaviorTrack}
+        self.previous_detections = {} #camera id -> detections of the last timestep for cameras faster than 1 fps 
+        self.frame_positions = {} #camera id -> {object id: center} at the last frame of cameras slower than 1 fps 
+        self.motion = {} #camera id -> (previous, current) centers of the detections of cameras sampled this timestep 
+
+        #Optional SensorNoise applied to the mdx-raw and mdx-frames output. Tripwire and behavior output use the true tracks 
+        self.noise = noise 
 
-        with open(self.index_file, "w+") as file:
-            pass 
+        #Rollup indices. Window in seconds -> start of the current window and {(camera id, roi id): Rollup} 
+        self.rollups = {window: [None, {}] for window in rollups}
+
+        self.sink = sink if sink is not None else FileSink(output_file) #where records are written 
     
     @property
     def timestamp_formatted(self):
@@ -47,69 +182,313 @@ class Analytics2D:
         """Increment timestamp by n seconds"""
         self.timestamp = self.timestamp + datetime.timedelta(seconds=n)
 
-    def _make_mdx_frames(self, state):
-        """Write out mdx-frame index based on passed in state"""
-        with open(self.index_file, "a") as index_file:
+    def _start_tick(self, timestep):
+        """Compute the timestamp, frame id and index names used by all records of the timestep"""
+        self.frame_count = timestep 
+        self._inc_timestamp(1)
+
+        self.tick_timestamp = self.timestamp_formatted
+        self.tick_frame_id = str(timestep)
+        self.tick_timestamps = {1.0: self.tick_timestamp}
+        date = self.tick_timestamp[:10]
+        if date != self.tick_date: #index names only change once per day 
+            self.tick_date = date 
+            self.tick_index = {kind: f"mdx-{kind}-{date}" for kind in ("raw", "frames", "tripwire", "behavior")}
+
+    def _sample_timestamp(self, fraction):
+        """Timestamp of a frame taken at a fraction of the current timestep"""
+        if fraction not in self.tick_timestamps:
+            timestamp = self.timestamp - datetime.timedelta(seconds=1 - fraction)
+            self.tick_timestamps[fraction] = timestamp.isoformat("T")[0:-3] + "Z"
+        return self.tick_timestamps[fraction]
+
+    def _project(self, camera, objects, boxes, velocity):
+        """Project world rectangles of objects into camera pixel coordinates"""
+
+        #world rectangle -> camera local pixels 
+        res_w, res_h = self.resolution
+        scale = np.array([res_w / camera.width, res_h / camera.height] * 2)
+        offset = np.array([camera.x, camera.y] * 2)
+        boxes = np.clip((boxes - offset) * scale, 0, [res_w, res_h, res_w, res_h])
+
+        #speed and direction from the displacement since the last frame 
+        speed = np.hypot(velocity[:, 0], velocity[:, 1])
+        direction = np.divide(velocity, speed[:, None], out=np.zeros_like(velocity), where=speed[:, None] > 0)
+
+        return DetectionBatch(ids=[obj.gid for obj in objects], types=[obj.type for obj in objects], 
+                              boxes=boxes, speed=speed, direction=direction, confidence=np.ones(len(objects)))
+
+    def _detection_batch(self, camera):
+        """Batch of the detections of the simulator at the end of the timestep in camera.detections order"""
+        rows = self.tracker.lookup(camera.detections)
+        boxes = np.array([obj.bbox for obj in camera.detections], dtype=float).reshape(-1, 4)
+        return self._project(camera, camera.detections, boxes, self.tracker.velocity[rows])
+
+    def _frame_motion(self, camera):
+        """Centers of the detections of a camera at its previous and current frame 
+
+        Motion between timesteps is linear so crossings between the frames of cameras faster than 1 fps are found 
+        from the last and current timestep. Cameras slower than 1 fps compare with the positions at their last frame 
+        so crossings between two frames are not lost. 
+        """
+        rows = self.tracker.lookup(camera.detections)
+        prev = self.tracker.prev[rows]
+        curr = self.tracker.curr[rows]
+        if camera.fps < 1:
+            last = self.frame_positions.get(camera.gid, {})
+            for i, obj in enumerate(camera.detections):
+                if obj.gid in last:
+                    prev[i] = last[obj.gid]
+            self.frame_positions[camera.gid] = dict(zip([obj.gid for obj in camera.detections], curr.tolist()))
+        return prev, curr 
+
+    def _camera_frames(self, camera, samples):
+        """Make the frames a camera takes during the current timestep"""
+
+        #One frame at the end of the timestep uses the detections of the simulator 
+        if samples == ((samples[0][0], 1.0),):
+            batch = self._detection_batch(camera)
+            rois = [(roi, [(obj.gid, obj.type, obj.x, obj.y) for obj in roi.detections]) for roi in camera.rois]
+            return [CameraFrame(camera, str(samples[0][0]), self.tick_timestamp, batch, rois)]
+
+        #Frames between timesteps interpolate the motion of objects seen at the start or end of the timestep 
+        candidates = list({obj.gid: obj for obj in self.previous_detections.get(camera.gid, []) + camera.detections}.values())
+        rows = self.tracker.lookup(candidates)
+        velocity = self.tracker.velocity[rows]
+        boxes = np.array([obj.bbox for obj in candidates], dtype=float).reshape(-1, 4)
+        fractions = np.array([fraction for _, fraction in samples])
+
+        #(samples, objects) arrays of positions and visibility 
+        shift = (fractions[:, None, None] - 1) * velocity[None]
+        centers = self.tracker.curr[rows][None] + shift 
+        in_camera = _inside(centers, camera.bbox)
+        in_rois = [_inside(centers, roi.bbox) for roi in camera.rois]
+        corners = boxes[None, :, 0:2] + shift 
+
+        frames = []
+        for i, (frame_number, fraction) in enumerate(samples):
+            visible = np.nonzero(in_camera[i])[0]
+            objects = [candidates[j] for j in visible]
+            batch = self._project(camera, objects, boxes[visible] + np.tile(shift[i, visible], 2), velocity[visible])
+
+            rois = []
+            for roi, in_roi in zip(camera.rois, in_rois):
+                rois.append((roi, [(candidates[j].gid, candidates[j].type, *corners[i, j].tolist()) for j in np.nonzero(in_roi[i])[0]]))
+
+            frames.append(CameraFrame(camera, str(frame_number), self._sample_timestamp(fraction), batch, rois))
+        return frames 
 
-            #Each camera outputs 1 mdx_frame line to the file 
-            for camera_id, camera in state.cameras.items():
+    def _add_noise(self, frame):
+        """Copy of a camera frame with noisy detections. ROIs keep the detected objects under their reported ids"""
+        batch, reported = self.noise(frame.batch, self.resolution)
+        rois = [(roi, [(reported[gid], type, x, y) for gid, type, x, y in objects if gid in reported]) for roi, objects in frame.rois]
+        return replace(frame, batch=batch, rois=rois)
+
+    def _make_mdx_frames(self, frame):
+        """Write out mdx-frame index for a camera frame"""
                 
-                #Create fov field - summarizes detected objects and counts 
-
-                #make a fov object for each object type
-                fov_list = []
-                for type, objects in camera.detections_sorted.items():
-                    fov_list.append(fov_pyd(id="", coordinates=[], count=len(objects), ids=[], type=type))
-
-
-                #Create ROI field
-                roi_list = []
-                for roi in camera.rois:
-                    
-                    #One roi_pyd for each object type 
-                    for obj_type, obj_list in roi.detections_sorted.items():
-                        count = len(obj_list)
-                        ids = [x.gid for x in obj_list]
-                        coords_list = []
-                        for obj in obj_list:
-                            coords = coordinates_pyd(z=0, x=obj.x, y=obj.y) #Not sure if this should be relative to ROI or global coordinate system 
-                            coords_list.append(coords)
-
-                        roi_list.append(roi_pyd(id=roi.type, coordinates=coords_list, count=count, ids=ids, type=obj_type))
-
-                frame_info = {"place": self.place}
-                mdx_frame = mdx_frames_pyd(timestamp=self.timestamp_formatted, fov=fov_list, rois=roi_list, sensorId=camera.type, id=str(self.frame_count), info=frame_info)
-
-                elk_index = elk_index_pyd(index=f"mdx-frames-{self.timestamp_formatted[:10]}", id=str(uuid.uuid1()), source=mdx_frame)
-                elk_index_json = elk_index.model_dump_json(by_alias=True)
-                index_file.write(elk_index_json)
-                index_file.write("\n")
-        
+        #Create fov field - summarizes detected objects and counts 
+
+        #make a fov object for each object type
+        fov_list = []
+        for type, count in Counter(frame.batch.types).items():
+            fov_list.append(fov_pyd(id="", coordinates=[], count=count, ids=[], type=type))
 
-    def _make_raw_index(self,state):
-        """Write out mdx-raw index based on passed in state"""
-        with open(self.index_file, "a") as index_file:
 
-            for _, camera in state.cameras.items():
+        #Create ROI field
+        roi_list = []
+        for roi, roi_objects in frame.rois:
                 
-                objects = []
-                for obj in camera.detections:
-                    box = bbox_pyd(leftX=0, bottomY=0, topY=100, rightX=100)
-                    mdx_obj = object_pyd(bbox=box, id=obj.gid, type=obj.type)
-                    objects.append(mdx_obj)
+            #One roi_pyd for each object type 
+            sorted_objects = {}
+            for gid, obj_type, x, y in roi_objects:
+                sorted_objects.setdefault(obj_type, []).append((gid, x, y))
+
+            for obj_type, obj_list in sorted_objects.items():
+                count = len(obj_list)
+                ids = [gid for gid, _, _ in obj_list]
+                coords_list = []
+                for _, x, y in obj_list:
+                    coords = coordinates_pyd(z=0, x=x, y=y) #Not sure if this should be relative to ROI or global coordinate system 
+                    coords_list.append(coords)
+
+                roi_list.append(roi_pyd(id=roi.type, coordinates=coords_list, count=count, ids=ids, type=obj_type))
 
-                raw = mdx_raw_pyd(timestamp=self.timestamp_formatted, id=str(self.frame_count), sensorId=camera.type, objects=objects)
+        frame_info = {"place": self.place}
+        mdx_frame = mdx_frames_pyd(timestamp=frame.timestamp, fov=fov_list, rois=roi_list, sensorId=frame.camera.type, id=frame.frame_id, info=frame_info)
+
+        elk_index = elk_index_pyd(index=self.tick_index["frames"], id=self.record_id(), source=mdx_frame)
+        self.sink.write(elk_index)
+        
+
+    def _make_raw_index(self, frame):
+        """Write out mdx-raw index for a camera frame"""
+                
+        objects = frame.batch.objects()
+        raw = mdx_raw_pyd(timestamp=frame.timestamp, id=frame.frame_id, sensorId=frame.camera.type, objects=objects)
              
-                elk_raw = elk_index_pyd(index=f"mdx-raw-{self.timestamp_formatted[:10]}", id=str(uuid.uuid1()), source=raw)
-                elk_json = elk_raw.model_dump_json(by_alias=True)
-                index_file.write(elk_json)
-                index_file.write("\n")
+        elk_raw = elk_index_pyd(index=self.tick_index["raw"], id=self.record_id(), source=raw)
+        self.sink.write(elk_raw)
+
+    def _make_tripwire_index(self, state):
+        """Write out mdx-tripwire index for objects that crossed a tripwire since the last timestep"""
+
+        for camera_id, camera in state.cameras.items():
+            if not camera.tripwires or not camera.detections or camera_id not in self.motion:
+                continue 
+
+            #Test every object against every tripwire of the camera at once 
+            wires = np.array([tripwire.segment for tripwire in camera.tripwires], dtype=float)
+            crossed, entered = segment_crossings(*self.motion[camera_id], wires)
+            if not crossed.any():
+                continue 
+
+            #Objects in camera.detections order. The last frame of faster cameras also holds objects of the last timestep 
+            batch = self.batches[camera_id]
+            if batch.ids != [obj.gid for obj in camera.detections]:
+                batch = self._detection_batch(camera)
+            objects = batch.objects()
+            for obj_i, wire_i in zip(*np.nonzero(crossed)):
+                mdx_obj = objects[obj_i]
+                direction = "IN" if entered[obj_i, wire_i] else "OUT"
+                tripwire = tripwire_pyd(timestamp=self.tick_timestamp, id=camera.tripwires[wire_i].type, sensorId=camera.type, direction=direction, object=mdx_obj)
+
+                elk_tripwire = elk_index_pyd(index=self.tick_index["tripwire"], id=self.record_id(), source=tripwire)
+                self.sink.write(elk_tripwire)
+
+    def _update_behavior(self, state):
+        """Extend the trajectory of every object in each camera and write out mdx-behavior index for finished tracks"""
+        finished = []
+        for camera_id, camera in state.cameras.items():
+            if camera_id not in self.motion:
+                continue 
+            tracks = self.tracks.setdefault(camera_id, {})
+
+            #Positions and distance travelled since the last frame for all detections of the camera at once 
+            prev, curr = self.motion[camera_id]
+            positions = curr.tolist()
+            steps = np.hypot(*(curr - prev).T).tolist()
+
+            detected = set()
+            for obj, (x, y), step in zip(camera.detections, positions, steps):
+                detected.add(obj.gid)
+                track = tracks.get(obj.gid)
+                if track is None:
+                    tracks[obj.gid] = BehaviorTrack(camera.type, obj.type, self.tick_timestamp, self.frame_count, x, y)
+                    continue 
+
+                track.update(self.tick_timestamp, self.frame_count, x, y, step)
+
+                #Limit memory of long tracks by writing them out and starting a new track 
+                if len(track.locations) >= self.max_track_length:
+                    finished.append((obj.gid, track))
+                    tracks[obj.gid] = BehaviorTrack(camera.type, obj.type, self.tick_timestamp, self.frame_count, x, y)
+
+            #Objects that left the camera finish their track 
+            for gid in [gid for gid in tracks if gid not in detected]:
+                finished.append((gid, tracks.pop(gid)))
+
+        self._write_behavior(finished)
+
+    def _write_behavior(self, finished):
+        """Write out mdx-behavior index for a list of (object id, track)"""
+        if not finished:
+            return 
+
+        for gid, track in finished:
+            duration = max(track.end_frame - track.start_frame, 1)
+            dx = track.locations[-1][0] - track.locations[0][0]
+            dy = track.locations[-1][1] - track.locations[0][1]
+            behavior = behavior_pyd(timestamp=track.start, end=track.end, id=gid, sensorId=track.sensor_id, objectType=track.type, locations=track.locations, 
+                                    distance=track.distance, speed=track.distance / duration, direction=math.degrees(math.atan2(dy, dx)))
+
+            elk_behavior = elk_index_pyd(index=f"mdx-behavior-{track.start[:10]}", id=self.record_id(), source=behavior)
+            self.sink.write(elk_behavior)
+
+    def _roll(self):
+        """Write out the rollups of windows that ended before the current timestep"""
+        seconds = calendar.timegm(self.timestamp.utctimetuple())
+        for window, (start, rollups) in self.rollups.items():
+            current = seconds - seconds % window 
+            if current != start:
+                self._write_rollups(window, start, rollups)
+                self.rollups[window] = [current, {}]
+
+    def _update_rollups(self, frame):
+        """Add a camera frame to the rollups of the camera and its ROIs"""
+        for window, (start, rollups) in self.rollups.items():
+            camera = frame.camera 
+            rollup = rollups.setdefault((camera.gid, None), Rollup(camera.type))
+            rollup.add(frame.batch.ids, frame.batch.types)
+
+            for roi, roi_objects in frame.rois:
+                rollup = rollups.setdefault((camera.gid, roi.gid), Rollup(camera.type, roi.type))
+                rollup.add([obj[0] for obj in roi_objects], [obj[1] for obj in roi_objects])
+
+    def _write_rollups(self, window, start, rollups):
+        """Write out mdx-rollup index for the cameras and ROIs of one window"""
+        if start is None:
+            return 
+
+        timestamp = datetime.datetime.utcfromtimestamp(start).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        end = datetime.datetime.utcfromtimestamp(start + window).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        label = f"{window // 60}m" if window % 60 == 0 else f"{window}s"
+        for rollup in rollups.values():
+            source = rollup_pyd(timestamp=timestamp, end=end, sensorId=rollup.sensor_id, roiId=rollup.roi_id, window=window, 
+                                frames=rollup.frames, objects=rollup.counts(), info={"place": self.place})
+            elk_rollup = elk_index_pyd(index=f"mdx-rollup-{label}-{timestamp[:10]}", id=self.record_id(), source=source)
+            self.sink.write(elk_rollup)
+
+    def close(self):
+        """Write out the tracks of objects that are still in view, the rollups of the last windows and close the sink"""
+        finished = []
+        for tracks in self.tracks.values():
+            finished.extend(tracks.items())
+        self.tracks = {}
+        self._write_behavior(finished)
+
+        for window, (start, rollups) in self.rollups.items():
+            self._write_rollups(window, start, rollups)
+        self.rollups = {}
+        self.sink.close()
 
     def __call__(self, state, timestep):
-        self.frame_count = timestep 
-        self._inc_timestamp(1)
+        self._start_tick(timestep)
+
+        #Track all objects seen by a camera in this or, for cameras faster than 1 fps, the last timestep 
+        detected = {obj.gid: obj for camera in state.cameras.values() for obj in camera.detections}
+        for objects in self.previous_detections.values():
+            for obj in objects:
+                detected.setdefault(obj.gid, obj)
+        self.tracker(list(detected.values()))
+        if self.noise:
+            self.noise.prune(detected)
+
+        #Each camera outputs 1 mdx-raw and 1 mdx-frames line per frame 
+        self._roll()
+        self.batches = {}
+        self.motion = {}
+        for camera_id, camera in state.cameras.items():
+            samples = sample_times(camera.fps, timestep)
+            if not samples:
+                continue 
+
+            self.motion[camera_id] = self._frame_motion(camera)
+            frames = self._camera_frames(camera, samples)
+            self.batches[camera_id] = frames[-1].batch #frame at the end of the timestep 
+            if self.noise:
+                frames = [self._add_noise(frame) for frame in frames]
+
+            for frame in frames:
+                self._make_raw_index(frame)
+                self._make_mdx_frames(frame)
+                if self.rollups:
+                    self._update_rollups(frame)
+
+            if camera.fps > 1:
+                self.previous_detections[camera_id] = list(camera.detections)
 
-        self._make_raw_index(state)
-        self._make_mdx_frames(state)
+        self._make_tripwire_index(state)
 
-        #TODO add trip wire and behavior output
\ No newline at end of file
+        if self.behavior:
+            self._update_behavior(state)
\ No newline at end of file
@@ -0,0 +1,309 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Distributed generation with a coordinator and workers that talk over TCP. 
+
+The coordinator splits the work into shards of one site (see sites2D.py) and one time window. Workers connect to 
+the coordinator, simulate the shards they are given and either stream the records back or write them to storage 
+shared with the coordinator. The coordinator merges the shards of each window by timestamp into one ELK dump. 
+
+Every shard is an independent simulation of its site seeded from the seed, site and window. Shards after the first 
+simulate `warmup` minutes before their window so the scene is not empty when the window starts. Frame ids and 
+timestamps are those of one continuous run, so the merged dump looks like a single run. Behavior tracks end at 
+window boundaries. 
+
+Example usage, everything on localhost: 
+python3 -m sim2d.distributed2D coordinator -c sites.yaml -t 1440 --window 60 --local_workers 4
+python3 -m sim2d.distributed2D worker --host 127.0.0.1 -p 9100
+"""
+
+import argparse
+import datetime 
+import heapq 
+import json 
+import os 
+import queue 
+import random 
+import re 
+import socket 
+import socketserver 
+import struct 
+import threading 
+import multiprocessing as mp 
+from itertools import count 
+import numpy as np 
+from .simulator2D import Simulator2D
+from .analytics2D import Analytics2D
+from .noise2D import SensorNoise
+from .scene2D import Item 
+from .sinks import BufferSink, FileSink
+from .sites2D import load_sites, prefix_gids
+from .utils import state_from_files
+
+
+def send_message(sock, message):
+    """Send a length prefixed JSON message"""
+    data = json.dumps(message).encode()
+    sock.sendall(struct.pack("<I", len(data)) + data)
+
+def _receive_exactly(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+def receive_message(sock):
+    length = struct.unpack("<I", _receive_exactly(sock, 4))[0]
+    return json.loads(_receive_exactly(sock, length))
+
+
+def make_shards(sites, minutes, window, start_time, seed=None, warmup=5):
+    """Split the run into one shard per site and time window"""
+    timesteps = minutes * 60
+    window_ticks = window * 60
+    shards = []
+    for w, offset in enumerate(range(0, timesteps, window_ticks)):
+        for i, site in enumerate(sites):
+            site_seed = None if seed is None else seed * 1000003 + i 
+            shards.append({"site": i, "sites": len(sites), "window": w, "diagram": site["diagram"], "yaml": site["yaml"], "place": site["place"],
+                           "offset": offset, "timesteps": min(window_ticks, timesteps - offset), "warmup": warmup * 60 if offset else 0,
+                           "start_time": start_time.isoformat(), "seed": None if site_seed is None else site_seed * 1009 + w})
+    return shards 
+
+def run_shard(shard, emit, chunk=1000):
+    """Simulate one shard and pass its records to emit in lists of up to chunk lines"""
+    seed = shard["seed"]
+    random.seed(seed)
+    np.random.seed(None if seed is None else seed % 2**32)
+    Item.gid_counter = count((shard["window"] * shard["sites"] + shard["site"]) * 10**8) #item ids stay unique across shards 
+
+    sim = Simulator2D(prefix_gids(state_from_files(shard["diagram"], shard["yaml"]), f"site{shard['site']}-"))
+    for _ in sim.run(shard["warmup"]):
+        pass 
+    sim.tick = shard["offset"] #cameras slower than 1 fps sample the same timesteps as a continuous run 
+
+    timestamp = datetime.datetime.fromisoformat(shard["start_time"]) + datetime.timedelta(seconds=shard["offset"])
+    analytics = Analytics2D(None, timestamp=timestamp, place=shard["place"], seed=seed, sink=BufferSink(), 
+                            noise=SensorNoise.from_yaml(shard["yaml"], seed=seed))
+    for i, state in enumerate(sim.run(shard["timesteps"])):
+        analytics(state, shard["offset"] + i)
+        if len(analytics.sink.lines) >= chunk:
+            emit(analytics.sink.drain())
+    analytics.close()
+    emit(analytics.sink.drain())
+
+TIMESTAMP = re.compile(r'"timestamp"\s*:\s*"([^"]*)"')
+
+def _timestamp(line):
+    """Timestamp of an ELK line. mdx timestamps sort in time order as strings"""
+    match = TIMESTAMP.search(line)
+    return match.group(1) if match else ""
+
+def shard_path(directory, shard):
+    return os.path.join(directory, f"shard-{shard['window']:05d}-{shard['site']:04d}.json")
+
+
+class Coordinator:
+    """Hands out shards to workers that connect over TCP and collects their records in a shard directory. 
+    A shard that fails or whose worker disconnects is handed out again, up to `retries` times"""
+
+    def __init__(self, shards, shard_dir, shared=False, host="127.0.0.1", port=9100, retries=3):
+        self.shards = shards 
+        self.shard_dir = shard_dir 
+        self.shared = shared #workers write the shard files themselves 
+        self.retries = retries 
+        os.makedirs(shard_dir, exist_ok=True)
+
+        self.todo = queue.Queue()
+        for shard in shards:
+            self.todo.put(shard)
+        self.remaining = len(shards)
+        self.attempts = {} #(window, site) -> number of failed attempts 
+        self.failed = {} #(window, site) -> error of the last attempt of shards that were given up 
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+
+        coordinator = self 
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                coordinator._serve(self.request)
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True 
+        self.address = self.server.server_address 
+
+    def _next_shard(self):
+        """Wait for a shard to hand out. None once every shard is done or given up"""
+        while not self.finished.is_set():
+            try:
+                return self.todo.get(timeout=0.2)
+            except queue.Empty: #shards still running may be handed out again 
+                continue 
+        return None 
+
+    def _finish(self, shard, error=None):
+        key = (shard["window"], shard["site"])
+        with self.lock:
+            if error is not None:
+                self.attempts[key] = self.attempts.get(key, 0) + 1
+                if self.attempts[key] < self.retries:
+                    print(f"Shard window {key[0]} site {key[1]} failed ({error}). It is handed out again.")
+                    self.todo.put(shard)
+                    return 
+                print(f"Shard window {key[0]} site {key[1]} failed {self.attempts[key]} times and is given up: {error}")
+                self.failed[key] = error 
+            self.remaining -= 1
+            print(f"Shard window {key[0]} site {key[1]} {'failed' if error else 'done'}. {self.remaining} shards remaining")
+            if self.remaining == 0:
+                self.finished.set()
+
+    def _serve(self, sock):
+        """Send shards to one worker until every shard is done. Idle workers wait for shards that are handed out again"""
+        while True:
+            shard = self._next_shard()
+            if shard is None:
+                try:
+                    send_message(sock, {"type": "exit"})
+                except OSError:
+                    pass 
+                return 
+
+            path = shard_path(self.shard_dir, shard)
+            part = path + ".part"
+            try:
+                send_message(sock, {"type": "shard", "shard": shard, "path": path if self.shared else None})
+                with open(part, "w+") as f:
+                    while True:
+                        message = receive_message(sock)
+                        if message["type"] in ("done", "error"):
+                            break 
+                        for line in message["lines"]:
+                            f.write(line)
+                            f.write("\n")
+            except (ConnectionError, OSError) as e:
+                self._remove(part, path if self.shared else None)
+                self._finish(shard, f"worker disconnected: {e}")
+                return 
+
+            if message["type"] == "error":
+                self._remove(part, path if self.shared else None)
+                self._finish(shard, message["message"])
+                continue 
+            if self.shared:
+                os.remove(part)
+            else:
+                os.replace(part, path)
+            self._finish(shard)
+
+    @staticmethod
+    def _remove(*paths):
+        for path in paths:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def run(self):
+        """Serve workers until every shard is done. Raises if shards were given up"""
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.finished.wait()
+        self.server.shutdown()
+        self.server.server_close()
+        if self.failed:
+            failed = "; ".join(f"window {window} site {site}: {error}" for (window, site), error in sorted(self.failed.items()))
+            raise Exception(f"{len(self.failed)} shards failed after {self.retries} attempts. {failed}")
+
+    def merge(self, sink):
+        """Write all shards to a sink. The site shards of every window are merged by timestamp, records of one site keep their order"""
+        for window in sorted(set(shard["window"] for shard in self.shards)):
+            paths = [shard_path(self.shard_dir, shard) for shard in sorted(self.shards, key=lambda s: s["site"]) if shard["window"] == window]
+            files = [open(path, "r") for path in paths]
+            try:
+                for line in heapq.merge(*files, key=_timestamp):
+                    sink.write_line(line.rstrip("\n"))
+            finally:
+                for f in files:
+                    f.close()
+            for path in paths:
+                os.remove(path)
+        sink.close()
+
+
+def worker(host="127.0.0.1", port=9100):
+    """Connect to a coordinator and run shards until it has none left"""
+    with socket.create_connection((host, port)) as sock:
+        while True:
+            message = receive_message(sock)
+            if message["type"] == "exit":
+                return 
+            shard, path = message["shard"], message["path"]
+
+            try:
+                if path: #shared storage. Only the completion is sent back 
+                    with open(path, "w+") as f:
+                        run_shard(shard, lambda lines: f.writelines(line + "\n" for line in lines))
+                else:
+                    run_shard(shard, lambda lines: send_message(sock, {"type": "records", "lines": lines}))
+            except ConnectionError: #the coordinator is gone 
+                raise 
+            except Exception as e: #the coordinator retries the shard or gives it up 
+                send_message(sock, {"type": "error", "message": f"{type(e).__name__}: {e}"})
+                continue 
+            send_message(sock, {"type": "done"})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed generation with a coordinator and TCP workers")
+    parser.add_argument("mode", choices=["coordinator", "worker"])
+    parser.add_argument('-c', "--config", required=False, type=str, default=None, help="Coordinator: path to the yaml file listing the sites (see sites2D.py)")
+    parser.add_argument('-t', "--time", required=False, type=int, default=60, help="Coordinator: number of minutes to generate")
+    parser.add_argument("--window", required=False, type=int, default=60, help="Coordinator: minutes per shard")
+    parser.add_argument("--warmup", required=False, type=int, default=5, help="Coordinator: minutes simulated before each window except the first")
+    parser.add_argument('-s', "--seed", required=False, type=int, default=0, help="Coordinator: seed of the run")
+    parser.add_argument('-o', "--output", required=False, type=str, default="mdx_elk.json", help="Coordinator: path of the merged ELK dump")
+    parser.add_argument("--shared", required=False, type=str, default=None, help="Coordinator: directory on storage shared with the workers. Workers write shards there instead of streaming them")
+    parser.add_argument("--local_workers", required=False, type=int, default=0, help="Coordinator: start this many workers on localhost")
+    parser.add_argument("--retries", required=False, type=int, default=3, help="Coordinator: attempts per shard before the run fails")
+    parser.add_argument("--host", required=False, type=str, default="127.0.0.1", help="Address the coordinator listens on or the worker connects to")
+    parser.add_argument('-p', "--port", required=False, type=int, default=9100, help="Port of the coordinator")
+    args = parser.parse_args()
+
+    if args.mode == "worker":
+        worker(args.host, args.port)
+    else:
+        if not args.config:
+            raise Exception("The coordinator requires a sites config with -c.")
+        start_time = datetime.datetime.utcnow() - datetime.timedelta(minutes=args.time)
+        shards = make_shards(load_sites(args.config), args.time, args.window, start_time, args.seed, args.warmup)
+        coordinator = Coordinator(shards, args.shared or f"{args.output}.shards", shared=bool(args.shared), host=args.host, port=args.port, retries=args.retries)
+        print(f"Coordinator listening on {coordinator.address[0]}:{coordinator.address[1]} with {len(shards)} shards")
+
+        workers = [mp.Process(target=worker, args=coordinator.address, daemon=True) for _ in range(args.local_workers)]
+        for process in workers:
+            process.start()
+        coordinator.run()
+        coordinator.merge(FileSink(args.output))
+        for process in workers:
+            process.join()
+        print(f"Wrote {args.output}")
@@ -0,0 +1,181 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import struct 
+import zlib 
+import numpy as np 
+from .scene2D import Item 
+
+def write_png(path, image):
+    """Write an (H, W, 3) uint8 image as a PNG file without extra dependencies"""
+    height, width, _ = image.shape 
+    raw = b"".join(b"\x00" + image[row].tobytes() for row in range(height)) #filter type 0 for every row 
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        f.write(chunk(b"IEND", b""))
+
+def colorize(grid):
+    """Map a grid to a white-yellow-red heat ramp. Uses a log scale so rarely visited cells stay visible"""
+    values = np.log1p(grid)
+    if values.max() > 0:
+        values = values / values.max()
+    image = np.empty(grid.shape + (3,), dtype=np.uint8)
+    image[..., 0] = 255
+    image[..., 1] = (255 * np.clip(1.5 - 1.5 * values, 0, 1)).astype(np.uint8)
+    image[..., 2] = (255 * np.clip(1 - 3 * values, 0, 1)).astype(np.uint8)
+    return image 
+
+
+class Heatmap2D:
+    """Simulator observer that accumulates occupancy and flow grids of every mover and item type 
+
+    The scene is split into cells of cell x cell pixels. Every timestep the center of each mover is binned into 
+    the grid of its type with one np.bincount per type. Item positions are never read: items are placed uniformly 
+    inside their parent, so the item count of each parent is spread over the cells the parent covers. The cost per 
+    timestep depends on the number of processes and movers, not on the number of items or the length of the run. 
+
+    - occupancy: timesteps an object of the type spent in each cell 
+    - flow: sum of the velocity (dx, dy) of the movers of the type in each cell 
+
+    If output_prefix and interval are set, snapshots are saved every interval timesteps. 
+    """
+
+    def __init__(self, width, height, cell=10, output_prefix=None, interval=None, images=True, items=True):
+        self.cell = cell 
+        self.cols = max(int(np.ceil(width / cell)), 1)
+        self.rows = max(int(np.ceil(height / cell)), 1)
+        self.output_prefix = output_prefix 
+        self.interval = interval 
+        self.images = images #also save a PNG of the occupancy of every type 
+        self.items = items #items are not moving on their own, set to False to only bin movers 
+        self.occupancy = {} #type -> (rows, cols) 
+        self.flow = {} #type -> (2, rows, cols) 
+        self.footprints = {} #process id -> (bbox, cells, weights) of the item centers inside the process 
+        self.ticks = 0
+
+    def _cells(self, x, y):
+        """Flat cell index of every position. Positions outside the scene are clamped to the border"""
+        cols = np.clip((x // self.cell).astype(int), 0, self.cols - 1)
+        rows = np.clip((y // self.cell).astype(int), 0, self.rows - 1)
+        return rows * self.cols + cols 
+
+    def _axis(self, start, length, n):
+        """Share of a uniform position in [start, start + length] that falls into each of n cells, clamped like _cells"""
+        edges = np.arange(n + 1) * self.cell 
+        end = start + length 
+        if length <= 0:
+            weights = np.zeros(n)
+            weights[min(max(int(start // self.cell), 0), n - 1)] = 1.0
+            return weights 
+        weights = np.clip(np.minimum(edges[1:], end) - np.maximum(edges[:-1], start), 0, None)
+        weights[0] += max(min(end, 0) - start, 0)
+        weights[-1] += max(end - max(start, edges[-1]), 0)
+        return weights / length 
+
+    def _footprint(self, process):
+        """Cells and weights of the item centers of a process. Cached until the process moves"""
+        cached = self.footprints.get(process.gid)
+        if cached is not None and cached[0] == process.bbox:
+            return cached[1], cached[2]
+        wx = self._axis(process.x + Item.size / 2, process.width, self.cols)
+        wy = self._axis(process.y + Item.size / 2, process.height, self.rows)
+        cols, rows = np.flatnonzero(wx), np.flatnonzero(wy)
+        cells = (rows[:, None] * self.cols + cols[None, :]).ravel()
+        weights = (wy[rows][:, None] * wx[cols][None, :]).ravel()
+        self.footprints[process.gid] = (process.bbox, cells, weights)
+        return cells, weights 
+
+    def _add(self, type, x, y, dx=None, dy=None):
+        cells = self._cells(x, y)
+        self._add_cells(type, cells)
+
+        if dx is not None:
+            size = self.rows * self.cols 
+            if type not in self.flow:
+                self.flow[type] = np.zeros((2, self.rows, self.cols))
+            self.flow[type][0] += np.bincount(cells, weights=dx, minlength=size).reshape(self.rows, self.cols)
+            self.flow[type][1] += np.bincount(cells, weights=dy, minlength=size).reshape(self.rows, self.cols)
+
+    def _add_cells(self, type, cells, weights=None):
+        """Add the occupancy of flat cell indices, optionally weighted"""
+        if type not in self.occupancy:
+            self.occupancy[type] = np.zeros((self.rows, self.cols))
+        self.occupancy[type] += np.bincount(cells, weights=weights, minlength=self.rows * self.cols).reshape(self.rows, self.cols)
+
+    def _add_items(self, state):
+        """Bin the items of every process and mover by the count of each type held by the parent"""
+        cells, weights = {}, {} #type -> lists of cell and weight arrays 
+        for process in state.processes.values():
+            for type, item_list in process.inventory.items.items():
+                if item_list:
+                    process_cells, process_weights = self._footprint(process)
+                    cells.setdefault(type, []).append(process_cells)
+                    weights.setdefault(type, []).append(process_weights * len(item_list))
+
+        #Movers are small so their items are binned at the mover center 
+        for fleet in state.fleets.values():
+            centers = self._cells(fleet.x + fleet.width / 2, fleet.y + fleet.height / 2)
+            for mover, cell in zip(fleet.movers, centers):
+                for type, item_list in mover.inventory.items.items():
+                    if item_list:
+                        cells.setdefault(type, []).append(np.array([cell]))
+                        weights.setdefault(type, []).append(np.array([float(len(item_list))]))
+
+        for type in cells:
+            self._add_cells(type, np.concatenate(cells[type]), np.concatenate(weights[type]))
+
+    def __call__(self, state, tick):
+        self.ticks += 1
+
+        #Movers are stored as arrays by their fleet 
+        for fleet in state.fleets.values():
+            self._add(fleet.type, fleet.x + fleet.width / 2, fleet.y + fleet.height / 2, fleet.dx, fleet.dy)
+
+        if self.items:
+            self._add_items(state)
+
+        if self.output_prefix and self.interval and tick > 0 and tick % self.interval == 0:
+            self.save(f"{self.output_prefix}_{tick:06d}")
+
+    def snapshot(self):
+        """Copy of the grids. {"occupancy": {type: (rows, cols)}, "flow": {type: (2, rows, cols)}}"""
+        return {"occupancy": {type: grid.copy() for type, grid in self.occupancy.items()}, 
+                "flow": {type: grid.copy() for type, grid in self.flow.items()}}
+
+    def save(self, path):
+        """Save the grids as path.npz and, if images is set, the occupancy of each type as path_<type>.png"""
+        arrays = {f"occupancy/{type}": grid for type, grid in self.occupancy.items()}
+        arrays.update({f"flow/{type}": grid for type, grid in self.flow.items()})
+        np.savez_compressed(f"{path}.npz", cell=self.cell, ticks=self.ticks, **arrays)
+
+        if self.images:
+            for type, grid in self.occupancy.items():
+                write_png(f"{path}_{type.replace(' ', '_')}.png", colorize(grid))
+
+    def close(self):
+        if self.output_prefix:
+            self.save(self.output_prefix)
@@ -0,0 +1,205 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import json 
+import math 
+from collections import deque 
+import numpy as np 
+
+class StreamingQuantile:
+    """Estimates a quantile of a stream in constant memory with the P-square algorithm (Jain and Chlamtac 1985)"""
+
+    def __init__(self, q):
+        self.q = q 
+        self.heights = [] #marker heights. The first 5 values are kept exactly 
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x):
+        if len(self.heights) < 5:
+            self.heights.append(x)
+            self.heights.sort()
+            return 
+
+        #Find the cell of x and update the extreme markers 
+        h = self.heights 
+        if x < h[0]:
+            h[0] = x 
+            k = 0
+        elif x >= h[4]:
+            h[4] = x 
+            k = 3
+        else:
+            k = next(i for i in range(4) if h[i] <= x < h[i + 1])
+
+        for i in range(k + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        #Move the middle markers towards their desired positions 
+        n = self.positions 
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = int(math.copysign(1, d))
+                parabolic = h[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+                if h[i - 1] < parabolic < h[i + 1]:
+                    h[i] = parabolic 
+                else:
+                    h[i] = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                n[i] += d 
+
+    @property
+    def value(self):
+        if not self.heights:
+            return None 
+        if len(self.heights) < 5:
+            return self.heights[min(int(self.q * len(self.heights)), len(self.heights) - 1)]
+        return self.heights[2]
+
+
+class RunningStats:
+    """Count, mean, min, max and streaming quantiles of a stream of values"""
+
+    def __init__(self, quantiles=(0.5, 0.9, 0.99)):
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf 
+        self.max = -math.inf 
+        self.quantiles = [StreamingQuantile(q) for q in quantiles]
+
+    def add(self, x):
+        self.count += 1
+        self.mean += (x - self.mean) / self.count 
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        for quantile in self.quantiles:
+            quantile.add(x)
+
+    def summary(self):
+        if self.count == 0:
+            return {"count": 0}
+        summary = {"count": self.count, "mean": round(self.mean, 3), "min": self.min, "max": self.max}
+        for quantile in self.quantiles:
+            summary[f"p{quantile.q * 100:g}"] = round(quantile.value, 3)
+        return summary 
+
+
+class WindowedRate:
+    """Total and rate per minute of a counter over the last `window` timesteps"""
+
+    def __init__(self, window=60):
+        self.window = deque(maxlen=window)
+        self.total = 0
+
+    def add(self, n):
+        self.window.append(n)
+        self.total += n 
+
+    def summary(self):
+        rate = sum(self.window) * 60 / len(self.window) if self.window else 0.0
+        return {"total": self.total, "per_minute": round(rate, 3)}
+
+
+class KPIAggregator:
+    """Simulator observer that keeps capacity planning KPIs in constant memory
+
+    - throughput: output batches completed by each process 
+    - queues: inventory size of each process 
+    - utilization: share of movers of each type that are not waiting to pick up items 
+    - dwell: seconds an object stays in each camera and ROI 
+
+    The summary is written to output_file every `interval` timesteps (if set) and when closed. 
+    No detection records are needed so the simulator can run without Analytics2D. 
+    """
+
+    def __init__(self, output_file="kpi_summary.json", interval=None, window=60, quantiles=(0.5, 0.9, 0.99)):
+        self.output_file = output_file 
+        self.interval = interval 
+        self.window = window #timesteps used for rates 
+        self.quantiles = quantiles 
+        self.ticks = 0
+
+        self.throughput = {} #process type -> WindowedRate 
+        self.completed = {} #process id -> completed batches at the last timestep 
+        self.queues = {} #process type -> RunningStats 
+        self.busy = {} #mover type -> [busy mover ticks, mover ticks] 
+        self.dwell = {} #sensor name -> RunningStats 
+        self.entered = {} #sensor id -> {object id: tick the object entered} 
+
+    def _stats(self, stats, name):
+        if name not in stats:
+            stats[name] = RunningStats(self.quantiles)
+        return stats[name]
+
+    def _update_dwell(self, sensor, tick):
+        entered = self.entered.setdefault(sensor.gid, {})
+        present = set()
+        for obj in sensor.detections:
+            present.add(obj.gid)
+            entered.setdefault(obj.gid, tick)
+
+        #Objects that left since the last frame 
+        stats = self._stats(self.dwell, sensor.type)
+        for gid in [gid for gid in entered if gid not in present]:
+            stats.add(tick - entered.pop(gid))
+
+    def __call__(self, state, tick):
+        self.ticks += 1
+
+        for id, process in state.processes.items():
+            done = process.completed - self.completed.get(id, 0)
+            self.completed[id] = process.completed 
+            self.throughput.setdefault(process.type, WindowedRate(self.window)).add(done)
+            self._stats(self.queues, process.type).add(process.inventory.size)
+
+        for fleet in state.fleets.values():
+            busy = self.busy.setdefault(fleet.type, [0, 0])
+            busy[0] += int(np.count_nonzero(fleet.state))
+            busy[1] += len(fleet.state)
+
+        for camera in state.cameras.values():
+            if camera.sampled:
+                self._update_dwell(camera, tick)
+        for roi in state.rois.values():
+            if roi.parent.sampled:
+                self._update_dwell(roi, tick)
+
+        if self.interval and tick > 0 and tick % self.interval == 0:
+            self.write()
+
+    def summary(self):
+        return {
+            "timesteps": self.ticks,
+            "throughput": {name: rate.summary() for name, rate in self.throughput.items()},
+            "queues": {name: stats.summary() for name, stats in self.queues.items()},
+            "utilization": {name: round(busy / total, 3) if total else 0.0 for name, (busy, total) in self.busy.items()},
+            "dwell": {name: stats.summary() for name, stats in self.dwell.items()},
+        }
+
+    def write(self):
+        with open(self.output_file, "w+") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def close(self):
+        self.write()
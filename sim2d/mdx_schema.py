@@ -34,14 +34,14 @@ class object_pyd(BaseModel):
     type: str
     confidence: float = 1.0
     dir: list = []
-    embedding: float = None
-    pose: float = None
-    lipActivity: str = None 
+    embedding: Union[float, None] = None
+    pose: Union[float, None] = None
+    lipActivity: Union[str, None] = None
     speed: float = 0
     info: dict = {}
-    coordinate: str = None
-    gaze: str = None
-    location: str = None 
+    coordinate: Union[str, None] = None
+    gaze: Union[str, None] = None
+    location: Union[str, None] = None
 
 class mdx_raw_pyd(BaseModel):
     timestamp: str
@@ -82,12 +82,54 @@ class mdx_frames_pyd(BaseModel):
     type: str = "mdx-frames"
 
 
+class tripwire_pyd(BaseModel):
+    timestamp: str
+    id: str
+    sensorId: str 
+    direction: str
+    object: object_pyd
+    type: str = "mdx-tripwire"
+    version: str = "4.0"
+
+class behavior_pyd(BaseModel):
+    timestamp: str
+    end: str
+    id: str
+    sensorId: str
+    objectType: str
+    locations: list[list[float]]
+    distance: float
+    speed: float
+    direction: float
+    type: str = "mdx-behavior"
+    version: str = "4.0"
+
+class rollup_count_pyd(BaseModel):
+    type: str
+    min: int
+    max: int
+    mean: float
+    unique: int
+
+class rollup_pyd(BaseModel):
+    timestamp: str
+    end: str
+    sensorId: str
+    roiId: Union[str, None] = None #None for the whole camera 
+    window: int
+    frames: int
+    objects: list[rollup_count_pyd]
+    info: dict
+    type: str = "mdx-rollup"
+    version: str = "4.0"
+
+
 class elk_index_pyd(BaseModel):
     index: str = Field(serialization_alias="_index")
     type: str = Field("logs", serialization_alias="_type")
     id: str = Field(serialization_alias="_id")
     score: int = Field(1, serialization_alias="_score")
-    source: Union[mdx_raw_pyd, mdx_frames_pyd] = Field(serialization_alias="_source")
+    source: Union[mdx_raw_pyd, mdx_frames_pyd, tripwire_pyd, behavior_pyd, rollup_pyd] = Field(serialization_alias="_source")
 
     class Config:
         fields = {'index': '_index', 'type':"_type", 'id':"_id", 'score':"_score", "source":"_source"}
\ No newline at end of file
@@ -0,0 +1,122 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from itertools import count 
+import numpy as np 
+import yaml 
+
+class SensorNoise:
+    """Seeded noise applied to the detections of every camera frame 
+
+    Parameters are set per object type with a "default" entry for all other types: 
+    - miss: probability an object is not detected in a frame 
+    - false_positive: expected number of false detections of the type per camera frame 
+    - jitter: standard deviation in pixels of the box position 
+    - confidence: [mean, standard deviation] of the detection confidence, clipped to 0..1 
+    - id_switch: probability per frame that the tracker gives an object a new id. The new id is kept while the object stays in the scene 
+
+    All draws for a frame are made as arrays so the cost barely depends on the number of objects. 
+    """
+
+    defaults = {"miss": 0.0, "false_positive": 0.0, "jitter": 0.0, "confidence": [1.0, 0.0], "id_switch": 0.0}
+
+    def __init__(self, config, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.default = {**self.defaults, **(config.get("default") or {})}
+        self.params = {type: {**self.default, **(values or {})} for type, values in config.items() if type != "default"}
+        self.aliases = {} #object id -> id after an id switch 
+        self.switches = count()
+        self.false_ids = count()
+
+        #One row of parameters per type. Types seen in detections are added with the default parameters 
+        self.type_index = {}
+        self.table = np.zeros((0, 6)) #miss, false_positive, jitter, confidence mean, confidence std, id_switch 
+        self._add_types(self.params)
+
+    @classmethod
+    def from_yaml(cls, yaml_path, seed=None):
+        """Noise model of the optional 'noise' section of a scene yaml. None if the yaml has no noise section"""
+        with open(yaml_path, "r") as f:
+            config = yaml.full_load(f).get("noise")
+        return cls(config, seed) if config else None 
+
+    def _add_types(self, types):
+        rows = []
+        for type in types:
+            if type not in self.type_index:
+                self.type_index[type] = len(self.type_index)
+                p = self.params.get(type, self.default)
+                rows.append([p["miss"], p["false_positive"], p["jitter"], *p["confidence"], p["id_switch"]])
+        if rows:
+            self.table = np.vstack([self.table, rows])
+            self.type_names = list(self.type_index)
+
+    def _rows(self, types):
+        """Parameter rows of a list of types"""
+        index = self.type_index 
+        if not index.keys() >= set(types):
+            self._add_types(types)
+        return self.table[[index[type] for type in types]].reshape(-1, 6)
+
+    def prune(self, ids):
+        """Drop the id switches of objects that are no longer detected by any camera"""
+        if self.aliases:
+            self.aliases = {gid: alias for gid, alias in self.aliases.items() if gid in ids}
+
+    def __call__(self, batch, resolution):
+        """Return a noisy copy of a DetectionBatch and the ids kept {original id: reported id}"""
+        params = self._rows(batch.types)
+        draws = self.rng.random((2, len(batch.ids)))
+
+        #Missed detections 
+        keep = np.flatnonzero(draws[0] >= params[:, 0])
+        ids = [batch.ids[i] for i in keep]
+        types = [batch.types[i] for i in keep]
+        boxes = batch.boxes[keep]
+        params = params[keep]
+
+        #Id switches are kept until the object leaves the scene, see prune 
+        for i in np.flatnonzero(draws[1, keep] < params[:, 5]):
+            self.aliases[ids[i]] = f"{ids[i]}-{next(self.switches)}"
+        reported = [self.aliases.get(gid, gid) for gid in ids] if self.aliases else ids 
+
+        #False positives of every known type with random boxes of 2-10% of the image 
+        fp_counts = self.rng.poisson(self.table[:, 1])
+        res = np.array(resolution * 2, dtype=float)
+        fp = int(fp_counts.sum())
+        if fp:
+            fp_index = np.repeat(np.arange(len(fp_counts)), fp_counts)
+            size = self.rng.uniform(0.02, 0.1, (fp, 2)) * res[:2]
+            corner = self.rng.uniform(0, 1, (fp, 2)) * (res[:2] - size)
+            boxes = np.concatenate([boxes, np.hstack([corner, corner + size])])
+            reported = reported + [f"false-{next(self.false_ids)}" for _ in range(fp)]
+            types = types + [self.type_names[i] for i in fp_index]
+            params = np.concatenate([params, self.table[fp_index]])
+
+        #Position jitter and confidence for every detection 
+        normal = self.rng.normal(0, 1, (len(types), 3))
+        boxes = np.clip(boxes + np.tile(normal[:, :2] * params[:, 2:3], 2), 0, res)
+        confidence = np.clip(params[:, 3] + params[:, 4] * normal[:, 2], 0, 1)
+
+        speed = np.concatenate([batch.speed[keep], np.zeros(fp)])
+        direction = np.concatenate([batch.direction[keep], np.zeros((fp, 2))])
+        noisy = type(batch)(ids=reported, types=types, boxes=boxes, speed=speed, direction=direction, confidence=confidence)
+        return noisy, dict(zip(ids, reported))
@@ -0,0 +1,221 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Hot reload of a running scene. 
+
+HotReload watches the drawio diagram and yaml file of a running simulation. When either changes, the files are parsed 
+into a new State2D and compared with the running state by drawio id. Added, removed and changed processes, movers, 
+cameras, ROIs and tripwires are applied to the running state in place, so unchanged components keep their inventories, 
+items and mover positions. 
+
+Example usage: 
+python3 main.py -d examples/warehouse_small.drawio -y examples/warehouse_small.yaml -t 600 -a --reload
+"""
+
+import os 
+from dataclasses import dataclass, field 
+from .scene2D import Item 
+from .utils import state_from_files
+
+CATEGORIES = ("processes", "fleets", "cameras", "rois", "tripwires")
+
+
+def _geometry(obj):
+    return (obj.type, obj.x, obj.y, obj.width, obj.height)
+
+def _fleet_structure(fleet):
+    """Fleets that differ in these are replaced. Other changes are applied to the running movers"""
+    return (fleet.type, fleet.source_p.gid, fleet.target_p.gid, len(fleet.movers), fleet.routes is None)
+
+def _routes(fleet):
+    return None if fleet.routes is None else [route.tolist() for route in fleet.routes]
+
+KEYS = {
+    "processes": lambda p: (_geometry(p), p.required_time, dict(p.required_inputs), dict(p.required_outputs), p.inventory.capacity, p.inventory.overflow),
+    "fleets": lambda f: (_fleet_structure(f), f.speed, f.capacity, f.jitter, _routes(f)),
+    "cameras": lambda c: (_geometry(c), c.fps),
+    "rois": lambda r: (_geometry(r), r.parent.gid),
+    "tripwires": lambda t: (t.type, t.segment, t.parent.gid),
+}
+
+
+@dataclass
+class SceneDiff:
+    """Ids of the added, removed and changed components of each category"""
+    added: dict = field(default_factory=lambda: {name: [] for name in CATEGORIES})
+    removed: dict = field(default_factory=lambda: {name: [] for name in CATEGORIES})
+    changed: dict = field(default_factory=lambda: {name: [] for name in CATEGORIES})
+    resized: bool = False #the size of the diagram changed 
+
+    @property
+    def empty(self):
+        return not self.resized and not any(ids for diff in (self.added, self.removed, self.changed) for ids in diff.values())
+
+    def __str__(self):
+        parts = []
+        for name in CATEGORIES:
+            counts = [f"{len(diff[name])} {label}" for label, diff in (("added", self.added), ("removed", self.removed), ("changed", self.changed)) if diff[name]]
+            if counts:
+                parts.append(f"{name}: {', '.join(counts)}")
+        return "; ".join(parts) or "no changes"
+
+
+def diff_states(old, new):
+    """Structural diff of two scenes. Components are matched by their drawio id"""
+    diff = SceneDiff(resized=(old.width, old.height) != (new.width, new.height))
+    for name in CATEGORIES:
+        old_objects, new_objects = getattr(old, name), getattr(new, name)
+        key = KEYS[name]
+        diff.added[name] = [id for id in new_objects if id not in old_objects]
+        diff.removed[name] = [id for id in old_objects if id not in new_objects]
+        diff.changed[name] = [id for id in new_objects if id in old_objects and key(old_objects[id]) != key(new_objects[id])]
+    return diff 
+
+
+def _release(inventory):
+    """Remove the items of a deleted process or mover from the simulation"""
+    Item.set_used(inventory.get(inventory.available_items()))
+
+def _update_process(process, new):
+    resized = (process.width, process.height) != (new.width, new.height)
+    process.type, process.x, process.y, process.width, process.height = _geometry(new)
+    process.required_inputs = new.required_inputs 
+    process.required_outputs = new.required_outputs 
+    process.required_time = new.required_time 
+    process.current_time = min(process.current_time, new.required_time) #a running batch finishes no later than with the new time 
+    process.inventory.capacity = new.inventory.capacity 
+    process.inventory.overflow = new.inventory.overflow 
+    if resized: #place the items inside the new rectangle 
+        Item.set_parent(process.inventory.items, process)
+
+def _update_fleet(fleet, new):
+    fleet.speed, fleet.capacity, fleet.jitter = new.speed, new.capacity, new.jitter 
+    for mover in fleet.movers:
+        mover.speed, mover.capacity = new.speed, new.capacity 
+    if _routes(fleet) != _routes(new): #a process moved. Movers follow the new routes from their first waypoint 
+        fleet.routes = new.routes 
+        fleet.waypoint[:] = 0
+
+def _bind_fleet(fleet, processes):
+    """Point a fleet parsed from the new files at the running processes"""
+    fleet.source_p = processes[fleet.source_p.gid]
+    fleet.target_p = processes[fleet.target_p.gid]
+    for mover in fleet.movers:
+        mover.source_p, mover.target_p = fleet.source_p, fleet.target_p 
+
+
+def apply_diff(sim, new, diff):
+    """Apply a diff to the running scene of a simulator. new is the scene parsed from the changed files"""
+    state = sim.state 
+
+    #Processes first, fleets and sensors refer to them 
+    for id in diff.removed["processes"]:
+        _release(state.processes.pop(id).inventory)
+    for id in diff.added["processes"]:
+        state.processes[id] = new.processes[id]
+        state.processes[id].item_tracker = state.item_tracker 
+    for id in diff.changed["processes"]:
+        _update_process(state.processes[id], new.processes[id])
+
+    #Fleets whose edge, mover type, count or routing changed are replaced. Their carried items are removed 
+    replaced = [id for id in diff.changed["fleets"] if _fleet_structure(state.fleets[id]) != _fleet_structure(new.fleets[id])]
+    for id in diff.removed["fleets"] + replaced:
+        for mover in state.fleets.pop(id).movers:
+            _release(mover.inventory)
+    for id in diff.added["fleets"] + replaced:
+        state.fleets[id] = new.fleets[id]
+        _bind_fleet(state.fleets[id], state.processes)
+    for id in diff.changed["fleets"]:
+        if id not in replaced:
+            _update_fleet(state.fleets[id], new.fleets[id])
+    state.movers = {mover.gid: mover for fleet in state.fleets.values() for mover in fleet.movers}
+
+    #Cameras, then the ROIs and tripwires inside them 
+    for id in diff.removed["cameras"]:
+        del state.cameras[id]
+    for id in diff.added["cameras"]:
+        state.cameras[id] = new.cameras[id]
+    for id in diff.changed["cameras"]:
+        camera, new_camera = state.cameras[id], new.cameras[id]
+        camera.type, camera.x, camera.y, camera.width, camera.height = _geometry(new_camera)
+        camera.fps = new_camera.fps 
+
+    for name in ("rois", "tripwires"):
+        sensors, new_sensors = getattr(state, name), getattr(new, name)
+        for id in diff.removed[name]:
+            del sensors[id]
+        for id in diff.added[name]:
+            sensors[id] = new_sensors[id]
+        for id in diff.changed[name]:
+            sensor = sensors[id]
+            sensor.type, sensor.x, sensor.y, sensor.width, sensor.height = _geometry(new_sensors[id])
+            if name == "tripwires":
+                sensor.x1, sensor.y1, sensor.x2, sensor.y2 = new_sensors[id].segment 
+        for id, sensor in sensors.items():
+            sensor.parent = state.cameras[new_sensors[id].parent.gid]
+    for id, camera in state.cameras.items():
+        camera.rois = [state.rois[roi.gid] for roi in new.cameras[id].rois]
+        camera.tripwires = [state.tripwires[tripwire.gid] for tripwire in new.cameras[id].tripwires]
+
+    state.width, state.height = new.width, new.height 
+    sim.invalidate() #sensors and processes may have moved 
+
+
+class HotReload:
+    """Watches the scene files of a running simulator and applies their changes between timesteps. 
+    Call it after each timestep. Files are checked every `interval` timesteps"""
+
+    def __init__(self, sim, diagram_path, yaml_path, interval=5):
+        self.sim = sim 
+        self.paths = (diagram_path, yaml_path)
+        self.interval = interval 
+        self.mtimes = self._mtimes()
+        self.reloads = 0
+
+    def _mtimes(self):
+        try:
+            return tuple(os.stat(path).st_mtime_ns for path in self.paths)
+        except FileNotFoundError: #editors may replace the file while saving 
+            return None 
+
+    def reload(self):
+        """Parse the scene files and apply the differences. Returns the diff or None if the files are invalid"""
+        try:
+            new = state_from_files(*self.paths)
+        except Exception as e:
+            print(f"Could not reload the scene, the running scene is kept: {e}")
+            return None 
+        diff = diff_states(self.sim.state, new)
+        if not diff.empty:
+            apply_diff(self.sim, new, diff)
+            self.reloads += 1
+        print(f"Reloaded scene: {diff}")
+        return diff 
+
+    def __call__(self, state, tick):
+        if tick % self.interval:
+            return None 
+        mtimes = self._mtimes()
+        if mtimes is None or mtimes == self.mtimes:
+            return None 
+        self.mtimes = mtimes 
+        return self.reload()
@@ -0,0 +1,123 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import heapq 
+import math 
+import numpy as np 
+
+class RoutePlanner:
+    """Plans routes between processes on a grid over the diagram. Other processes are obstacles
+
+    Routes are planned once per source/target pair and cached. A route is an array of waypoints 
+    (x, y) for the center of a mover, ending at the center of the target.
+    """
+
+    def __init__(self, width, height, processes, cell=10, clearance=5):
+        self.cell = cell 
+        self.processes = list(processes)
+        self.cols = max(int(math.ceil(width / cell)), 1)
+        self.rows = max(int(math.ceil(height / cell)), 1)
+        self.clearance = clearance #half the size of a mover so movers do not clip other processes 
+        self.routes = {} #(source gid, target gid) -> waypoints 
+
+    def _blocked(self, source, target):
+        """Grid of cells covered by processes other than the source and target"""
+        blocked = np.zeros((self.rows, self.cols), dtype=bool)
+        for process in self.processes:
+            if process is source or process is target:
+                continue 
+            x1, y1, x2, y2 = process.bbox 
+            c1 = max(int((x1 - self.clearance) // self.cell), 0)
+            r1 = max(int((y1 - self.clearance) // self.cell), 0)
+            c2 = int((x2 + self.clearance) // self.cell)
+            r2 = int((y2 + self.clearance) // self.cell)
+            blocked[r1:r2 + 1, c1:c2 + 1] = True 
+        return blocked 
+
+    def _cell(self, x, y):
+        return (min(max(int(y // self.cell), 0), self.rows - 1), min(max(int(x // self.cell), 0), self.cols - 1))
+
+    def _search(self, start, goal, blocked):
+        """A* over 8 connected cells. Returns the list of cells from start to goal or None"""
+        came_from = {start: None}
+        cost = {start: 0.0}
+        frontier = [(0.0, start)]
+        while frontier:
+            _, cell = heapq.heappop(frontier)
+            if cell == goal:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = came_from[cell]
+                return path[::-1]
+
+            r, c = cell 
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    nr, nc = r + dr, c + dc 
+                    if (dr == 0 and dc == 0) or not (0 <= nr < self.rows and 0 <= nc < self.cols) or blocked[nr, nc]:
+                        continue 
+                    #No cutting corners of obstacles on diagonal steps 
+                    if dr and dc and (blocked[r, nc] or blocked[nr, c]):
+                        continue 
+                    new_cost = cost[cell] + math.hypot(dr, dc)
+                    if new_cost < cost.get((nr, nc), math.inf):
+                        cost[(nr, nc)] = new_cost 
+                        came_from[(nr, nc)] = cell 
+                        heuristic = math.hypot(goal[0] - nr, goal[1] - nc)
+                        heapq.heappush(frontier, (new_cost + heuristic, (nr, nc)))
+        return None 
+
+    def _simplify(self, path, blocked):
+        """Drop waypoints that can be skipped in a straight line without crossing an obstacle"""
+        waypoints = [path[0]]
+        i = 0
+        while i < len(path) - 1:
+            j = len(path) - 1
+            while j > i + 1 and not self._clear(path[i], path[j], blocked):
+                j -= 1
+            waypoints.append(path[j])
+            i = j 
+        return waypoints 
+
+    def _clear(self, a, b, blocked):
+        """True if the straight line between two cells does not cross a blocked cell"""
+        steps = int(max(abs(b[0] - a[0]), abs(b[1] - a[1])) * 2) + 1
+        rows = np.rint(np.linspace(a[0], b[0], steps + 1)).astype(int)
+        cols = np.rint(np.linspace(a[1], b[1], steps + 1)).astype(int)
+        return not blocked[rows, cols].any()
+
+    def route(self, source, target):
+        """Waypoints from the center of source to the center of target"""
+        key = (source.gid, target.gid)
+        if key in self.routes:
+            return self.routes[key]
+
+        blocked = self._blocked(source, target)
+        path = self._search(self._cell(*source.center), self._cell(*target.center), blocked)
+        if path is None:
+            print(f"Warning: no route from {source.type} to {target.type} that avoids other processes. Movers will go straight to the target.")
+            waypoints = []
+        else:
+            #Use the centers of the cells between the first and last cell, then the exact target center 
+            waypoints = [((c + 0.5) * self.cell, (r + 0.5) * self.cell) for r, c in self._simplify(path, blocked)[1:-1]]
+        self.routes[key] = np.array(waypoints + [target.center], dtype=float)
+        return self.routes[key]
@@ -19,22 +19,32 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-from dataclasses import dataclass 
+from dataclasses import dataclass, field 
 import yaml
 import xml.etree.ElementTree as ET 
 import random 
 import math 
 from collections import Counter 
 from random import randint, uniform
+from itertools import count
 import uuid 
+import numpy as np 
 
 class Inventory:
     """Class that holds a collection of Object2D items. Provides methods to easily add an subtract items"""
 
-    def __init__(self, capacity=-1):
-        #TODO implement capacity
+    def __init__(self, capacity=-1, overflow="block"):
         self.items = {} #store items by type
-        self.capacity = capacity 
+        self.capacity = capacity #max number of items. -1 is unlimited 
+        self.overflow = overflow #"block" returns items that do not fit, "drop" deletes them from the simulation 
+        self.dropped = 0 #number of items deleted because the inventory was full 
+
+    @property
+    def free_space(self):
+        if self.capacity < 0:
+            return math.inf 
+        return max(self.capacity - self.size, 0)
+
     @property 
     def size(self):
         size = 0
@@ -61,17 +71,33 @@ class Inventory:
 
 
     def put(self, items):
-        """Put items into inventory
+        """Put items into inventory. Returns the items that did not fit 
         
         input
         items Dict: {"item_type":[items]}
+
+        returns 
+        Dict: {"item_type":[items]} that were not put into the inventory. Always empty if overflow is "drop"
         
         """
+        rejected = {}
+        space = self.free_space
         for item_type, item_list in items.items():
+            if len(item_list) > space:
+                rejected[item_type] = item_list[space:]
+                item_list = item_list[:space]
+            space -= len(item_list)
+
             if item_type in self.items:
                 self.items[item_type].extend(item_list)
             else:
                 self.items[item_type] = item_list 
+
+        if rejected and self.overflow == "drop":
+            Item.set_used(rejected)
+            self.dropped += sum(len(item_list) for item_list in rejected.values())
+            return {}
+        return rejected 
     
     def get(self, items):
         """Try to returns available items
@@ -116,7 +142,6 @@ class Object2D:
         self.dx = 0
         self.dy = 0
 
-        self.registered_move= self._default_move
         self.registered_info = self._default_info
 
     @property
@@ -135,45 +160,34 @@ class Object2D:
             return True 
         return False 
 
-    def move(self, goto_x, goto_y):
-        self.registered_move(goto_x, goto_y)
+    def overlaps(self, object2d, margin=0):
+        """True if the rectangles of both objects intersect. margin grows this object's rectangle on all sides"""
+        x1, y1, x2, y2 = self.bbox 
+        ox1, oy1, ox2, oy2 = object2d.bbox 
+        return x1 - margin <= ox2 and ox1 <= x2 + margin and y1 - margin <= oy2 and oy1 <= y2 + margin 
 
     def info(self):
         return self.registered_info()
 
-    def _default_move(self, goto_x, goto_y):
-        """ Move the object """
-        self.x += self.dx
-        self.y += self.dy 
-
-        # #Check bounds
-        # self.x = max(0, self.x)
-        # self.y = max(0, self.y)
-        # self.x = min(max_x, self.x)
-        # self.y = min(max_y, max_y)
-
-        #Add velocity 
-        self.dx = random.uniform(-5,5)
-        self.dx = random.uniform(-5,5)
-
     def _default_info(self):
         """ Log data for the object like sensor values """
 
         return {"sensor1":1}
     
 class Process(Object2D):
-    def __init__(self, type, gid, x, y, width, height, time, inputs=None, outputs=None):
+    def __init__(self, type, gid, x, y, width, height, time, inputs=None, outputs=None, capacity=-1, overflow="block"):
         super().__init__(type, gid, x, y, width, height)
         
         self.required_inputs = Counter(inputs)
         self.required_outputs = Counter(outputs)
         
-        self.inventory = Inventory()
+        self.inventory = Inventory(capacity, overflow)
 
         self.required_time = time
         self.current_time = self.required_time
 
         self.state = 0 #0,1
+        self.completed = 0 #number of output batches made 
 
     @classmethod
     def from_xml(cls, xml, yaml):
@@ -190,20 +204,15 @@ class Process(Object2D):
         time = yaml["time"]
         inputs = yaml.get("input", None)
         outputs = yaml.get("output", None)
+        capacity = yaml.get("capacity", -1)
+        overflow = yaml.get("overflow", "block")
 
-
-        return cls(type, id, x ,y , width, height, time, inputs=inputs, outputs=outputs)
+        return cls(type, id, x ,y , width, height, time, inputs=inputs, outputs=outputs, capacity=capacity, overflow=overflow)
 
 
-    def put(self, items): #TODO could implement a size limit for process inventory 
-        """Return True if process accepted items otherwise false
-
-            TODO - If capacity is implemented, should return items that could not be put. 
-        
-        """
-        
-        self.inventory.put(items)
-        return True 
+    def put(self, items):
+        """Put items into the process inventory. Returns the items that could not be put because the inventory is full"""
+        return self.inventory.put(items)
          
 
     def get(self, items): #TODO Update to take in a counter to generalize 
@@ -224,9 +233,12 @@ class Process(Object2D):
         elif self.state == 1: #process inputs for some time then make outputs 
             if self.current_time > 0:
                 self.current_time -=1
+            elif self.inventory.overflow == "block" and self.inventory.free_space < sum(self.required_outputs.values()):
+                return #wait until there is space for the outputs 
             else:
                 self.state = 0
                 self.current_time = self.required_time 
+                self.completed += 1
 
                 #Create output items 
                 output_items = Item.items_from_dict(self.required_outputs, self)
@@ -236,6 +248,7 @@ class Process(Object2D):
             return 
         
 class Mover(Object2D):
+    """Carries items from the source to the target process. Movers are moved by a Fleet, State2D gives plain movers a fleet of one"""
     def __init__(self, type, gid, source_x, source_y, width, height, capacity, speed, source, target):
         super().__init__(type, gid, source_x, source_y, width, height)
         self.capacity = capacity
@@ -249,42 +262,66 @@ class Mover(Object2D):
         self.source_p = source 
         self.target_p = target
 
-        self.registered_move = self.travel
-
-        #State machine info 
+        #State machine info, stepped by the Fleet that holds the mover 
         self.state = 0 #0,1,2,3
 
         self.inventory = Inventory()
-    def rotate_vector(self, dx, dy, angle):
-        """Rotate a 2D vector by a given angle."""
-        radians = math.radians(angle)
-        rotated_dx = dx * math.cos(radians) - dy * math.sin(radians)
-        rotated_dy = dx * math.sin(radians) + dy * math.cos(radians)
-        return rotated_dx, rotated_dy
-
-    def travel(self, goto_x, goto_y):
-        """Updates the direction towards the target ROI."""
-
-        #calculate direction vector and normalize  
-        dx, dy = goto_x - self.x, goto_y - self.y
-        distance = math.sqrt(dx**2 + dy**2)
-        dx = (dx/distance)  
-        dy = (dy/distance)
 
-        #Apply random rotation to get variable movement 
-        rotation_angle = random.uniform(-90, 90)
-        dx, dy = self.rotate_vector(dx, dy, rotation_angle)
-        
-        #Apply speed
-        self.dx = dx * self.speed 
-        self.dy = dy * self.speed 
+    def __str__(self):
+        return f"{self.speed=}, {self.type=}"
+
+class FleetMover(Mover):
+    """Mover that is part of a Fleet. Position, velocity and state are stored in the arrays of the fleet"""
 
-        #Move object 
-        self.x += self.dx
-        self.y += self.dy 
+    def __init__(self, fleet, index, gid):
+        self.fleet = fleet 
+        self.index = index 
+        super().__init__(fleet.type, gid, fleet.source_x, fleet.source_y, fleet.width, fleet.height, fleet.capacity, fleet.speed, fleet.source_p, fleet.target_p)
+
+    x = property(lambda self: float(self.fleet.x[self.index]), lambda self, v: self.fleet.x.__setitem__(self.index, v))
+    y = property(lambda self: float(self.fleet.y[self.index]), lambda self, v: self.fleet.y.__setitem__(self.index, v))
+    dx = property(lambda self: float(self.fleet.dx[self.index]), lambda self, v: self.fleet.dx.__setitem__(self.index, v))
+    dy = property(lambda self: float(self.fleet.dy[self.index]), lambda self, v: self.fleet.dy.__setitem__(self.index, v))
+    state = property(lambda self: int(self.fleet.state[self.index]), lambda self, v: self.fleet.state.__setitem__(self.index, v))
+
+    def __call__(self):
+        """Fleet movers are updated together by their fleet"""
+        return 
+
+class Fleet:
+    """All movers of one drawio edge. Travel and the pickup/dropoff transitions of the mover state machine 
+    are done for the whole fleet at once"""
+
+    def __init__(self, type, gid, source_x, source_y, width, height, capacity, speed, source, target, count=1, routes=None, jitter=90):
+        self.type = type 
+        self.gid = gid 
+        self.capacity = capacity 
+        self.speed = speed 
+        self.width = float(width)
+        self.height = float(height)
+        self.source_x = source_x 
+        self.source_y = source_y 
+        self.source_p = source 
+        self.target_p = target 
+
+        #Position, velocity and state of every mover in the fleet 
+        self.x = np.full(count, source_x, dtype=float)
+        self.y = np.full(count, source_y, dtype=float)
+        self.dx = np.zeros(count)
+        self.dy = np.zeros(count)
+        self.state = np.zeros(count, dtype=np.int8)
+
+        #Optional planned routes. (waypoints to the target, waypoints to the source) 
+        self.routes = routes 
+        self.jitter = jitter #max random rotation in degrees of every step 
+        self.waypoint = np.zeros(count, dtype=int) #index of the next waypoint of every mover 
+
+        #A fleet of one keeps the id of the edge 
+        gids = [gid] if count == 1 else [f"{gid}-{i}" for i in range(count)]
+        self.movers = [FleetMover(self, i, mover_gid) for i, mover_gid in enumerate(gids)]
 
     @classmethod
-    def from_xml(cls, xml, yaml, source, target):
+    def from_xml(cls, xml, yaml, source, target, planner=None):
         x, y = source.center
 
         width = 10
@@ -295,50 +332,176 @@ class Mover(Object2D):
 
         speed = yaml[type]["speed"]
         capacity = yaml[type]["capacity"]
+        count = yaml[type].get("count", 1)
 
-        return cls(type, id, x, y, width, height, capacity, speed, source, target)
+        #Movers go straight to the target unless routes are planned 
+        routes = None 
+        jitter = yaml[type].get("jitter", 90)
+        if yaml[type].get("route", "direct") == "grid":
+            routes = (planner.route(source, target), planner.route(target, source))
+            jitter = yaml[type].get("jitter", 15)
 
-    def __call__(self):
-        if self.state == 0: #pick up items until inventory is full 
-            item_type = list(self.source_p.required_outputs.keys())[0] #get item type to move 
-            got_items = self.source_p.get({item_type:self.capacity})
-            Item.set_parent(got_items, self)
-            self.inventory.put(got_items) #TODO fix - this will make the mover have more items that capacity in some cases 
-            if self.inventory.size >= self.capacity:
-                self.state = 1
-
-        elif self.state == 1: #move to target process 
-            self.move(*self.target_p.center)
-            if self in self.target_p:
-                self.state = 2
-
-        elif self.state == 2: #drop items until inventory is empty 
-            got_items = self.inventory.get(self.inventory.available_items())
-            Item.set_parent(got_items, self.target_p)
-            self.target_p.put(got_items)
-            if self.inventory.size == 0:
-                self.state = 3
-
-        elif self.state == 3: #move to source process 
-            self.move(*self.source_p.center)
-            if self in self.source_p:
-                self.state = 0
+        return cls(type, id, x, y, width, height, capacity, speed, source, target, count, routes, jitter)
 
+    @classmethod
+    def from_mover(cls, mover):
+        """Fleet of one that takes over a plain Mover with its position, state and inventory"""
+        fleet = cls(mover.type, mover.gid, mover.source_x, mover.source_y, mover.width, mover.height, mover.capacity, mover.speed, mover.source_p, mover.target_p)
+        fleet.x[0], fleet.y[0], fleet.dx[0], fleet.dy[0], fleet.state[0] = mover.x, mover.y, mover.dx, mover.dy, mover.state 
+        fleet.movers[0].inventory = mover.inventory 
+        Item.set_parent(mover.inventory.items, fleet.movers[0])
+        return fleet 
+
+    def inside(self, process, index):
+        """True for the movers in index whose center is inside the process"""
+        x1, y1, x2, y2 = process.bbox 
+        cx = self.x[index] + self.width / 2
+        cy = self.y[index] + self.height / 2
+        return (cx >= x1) & (cx <= x2) & (cy >= y1) & (cy <= y2)
+
+    def overlapping(self, object2d, margin=0):
+        """Movers whose rectangle intersects the rectangle of object2d grown by margin"""
+        x1, y1, x2, y2 = object2d.bbox 
+        hits = (self.x <= x2 + margin) & (x1 - margin <= self.x + self.width) & (self.y <= y2 + margin) & (y1 - margin <= self.y + self.height)
+        return [self.movers[i] for i in np.flatnonzero(hits)]
+
+    def travel(self, index, goto_x, goto_y):
+        """Move the movers in index towards the goto point with a random rotation"""
+        dx, dy = goto_x - self.x[index], goto_y - self.y[index]
+        self._step(index, dx, dy, self.speed)
+
+    def follow(self, index, route):
+        """Move the movers in index along the waypoints of a planned route"""
+        waypoints = route[self.waypoint[index]]
+        dx = waypoints[:, 0] - (self.x[index] + self.width / 2)
+        dy = waypoints[:, 1] - (self.y[index] + self.height / 2)
+        distance = np.hypot(dx, dy)
+
+        #Steps are clamped so they do not overshoot the waypoint and every step with less than 90 degrees jitter gets closer 
+        self._step(index, dx, dy, self.speed, clamp=True)
+        reached = index[distance <= self.speed]
+        self.waypoint[reached] = np.minimum(self.waypoint[reached] + 1, len(route) - 1)
+
+    def _step(self, index, dx, dy, speed, clamp=False):
+        distance = np.hypot(dx, dy)
+        goal = distance.copy()
+        distance[distance == 0] = 1 
+        dx, dy = dx / distance, dy / distance
+
+        #Apply random rotation to get variable movement 
+        radians = np.radians(np.random.uniform(-self.jitter, self.jitter, len(index)))
+        cos, sin = np.cos(radians), np.sin(radians)
+        dx, dy = dx * cos - dy * sin, dx * sin + dy * cos
+
+        #A step of at most goal * cos ends closer to the goal whatever the rotation 
+        if clamp:
+            speed = np.minimum(speed, goal * cos)
+
+        self.dx[index] = dx * speed 
+        self.dy[index] = dy * speed 
+        self.x[index] += self.dx[index]
+        self.y[index] += self.dy[index]
+
+    def _move(self, index, state, process):
+        """Move the movers in index towards process. Movers that arrive go to the next state"""
+        if self.routes is None:
+            self.travel(index, *process.center)
         else:
-            return 
+            self.follow(index, self.routes[state == 3])
+        arrived = index[self.inside(process, index)]
+        self.state[arrived] = state + 1 if state == 1 else 0
+        self.waypoint[arrived] = 0
+
+    def pickup(self, index):
+        """Get the items of all picking up movers from the source process in one request"""
+        item_type = list(self.source_p.required_outputs.keys())[0] #get item type to move 
+        wants = [self.capacity - self.movers[i].inventory.size for i in index]
+        got_items = self.source_p.get({item_type:sum(wants)})[item_type]
+
+        #Hand out the items in fleet order 
+        start = 0
+        for i, want in zip(index, wants):
+            mover = self.movers[i]
+            items = {item_type:got_items[start:start + want]}
+            start += want 
+            Item.set_parent(items, mover)
+            mover.inventory.put(items)
+        sizes = np.fromiter((self.movers[i].inventory.size for i in index), dtype=int, count=len(index))
+        self.state[index[sizes >= self.capacity]] = 1
+
+    def dropoff(self, index):
+        """Put the items of all dropping off movers into the target process in one request"""
+        owners = {}
+        got_items = {}
+        for i in index:
+            mover = self.movers[i]
+            for item_type, item_list in mover.inventory.get(mover.inventory.available_items()).items():
+                got_items.setdefault(item_type, []).extend(item_list)
+                owners.update((item.gid, mover) for item in item_list)
+        Item.set_parent(got_items, self.target_p)
+        rejected = self.target_p.put(got_items)
+
+        #Keep items that did not fit until the target has space 
+        for item_list in rejected.values():
+            for item in item_list:
+                mover = owners[item.gid]
+                item.update_parent(mover)
+                mover.inventory.put({item.type:[item]})
+        sizes = np.fromiter((self.movers[i].inventory.size for i in index), dtype=int, count=len(index))
+        self.state[index[sizes == 0]] = 3
 
-    def __str__(self):
-        return f"{self.speed=}, {self.type=}"
+    def __call__(self):
+        #Each state is handled for all movers in it. Movers change state at most once per call like Mover 
+        states = self.state.copy()
+        if (states == 0).any(): #pick up items until inventory is full 
+            self.pickup(np.flatnonzero(states == 0))
+
+        index = np.flatnonzero(states == 1)
+        if len(index): #move to target process 
+            self._move(index, 1, self.target_p)
+
+        if (states == 2).any(): #drop items until inventory is empty 
+            self.dropoff(np.flatnonzero(states == 2))
+
+        index = np.flatnonzero(states == 3)
+        if len(index): #move to source process 
+            self._move(index, 3, self.source_p)
 
 class Item(Object2D):
+    """Item held by a process or mover. The position is computed from the parent only when it is read"""
+
+    item_tracker = {} #items by gid of processes that are not part of a State2D 
+    gid_counter = count() #unique ids so items can be tracked across frames 
+    size = 5
 
-    item_tracker = []
+    parent = None 
+    local_x = 0.0
+    local_y = 0.0
 
     def __init__(self, type, gid, x, y, width, height, parent):
         super().__init__(type, gid, x, y, width, height)
         self.update_parent(parent)
         self.used = False #Set to true if the item needs to be deleted from simulation  
-        Item.item_tracker.append(self)
+
+        #Register the item with the scene of the process that made it 
+        self.tracker = getattr(parent, "item_tracker", Item.item_tracker)
+        self.tracker[gid] = self
+
+    @property
+    def x(self):
+        return self.local_x + self.parent.x if self.parent else self.local_x 
+
+    @x.setter
+    def x(self, x):
+        self.local_x = x - self.parent.x if self.parent else x 
+
+    @property
+    def y(self):
+        return self.local_y + self.parent.y if self.parent else self.local_y 
+
+    @y.setter
+    def y(self, y):
+        self.local_y = y - self.parent.y if self.parent else y 
 
     @staticmethod
     def set_parent(items, parent):
@@ -348,20 +511,18 @@ class Item(Object2D):
 
     @staticmethod
     def set_used(items):
+        """Delete items from the simulation"""
         for item_type, item_list in items.items():
             for item in item_list:
                 item.used = True 
-
-    @staticmethod
-    def remove():
-        Item.item_tracker = [item for item in Item.item_tracker if item.used == False]
+                item.tracker.pop(item.gid, None)
 
     @classmethod
     def items_from_dict(cls, items, parent):
         
         ret_items = {}
         for item_type, num in items.items():
-            item_list = [cls(item_type, "-1", -1, -1, 5, 5, parent) for x in range(num)]
+            item_list = [cls(item_type, f"item-{next(cls.gid_counter)}", -1, -1, cls.size, cls.size, parent) for x in range(num)]
             ret_items[item_type] = item_list 
 
         return ret_items
@@ -375,21 +536,15 @@ class Item(Object2D):
         self.local_x = uniform(0, self.parent.width) 
         self.local_y = uniform(0, self.parent.height)
 
-        #update global x,y based on parent's postition 
-        self.x = self.local_x + self.parent.x
-        self.y = self.local_y + self.parent.y
-
-    def __call__(self):
-        #update global x,y based on parent's postition 
-        self.x = self.local_x + self.parent.x
-        self.y = self.local_y + self.parent.y 
-
 
 class Camera(Object2D):
-    def __init__(self, type, gid, x, y, width, height):
+    def __init__(self, type, gid, x, y, width, height, fps=1):
         super().__init__(type, gid, x, y, width, height)
         self.rois = []
+        self.tripwires = []
         self.detections = []
+        self.fps = fps #frames per second 
+        self.sampled = True #True if the camera took a frame in the last timestep 
 
     @property
     def detections_sorted(self):
@@ -412,7 +567,7 @@ class Camera(Object2D):
 
 
     @classmethod
-    def from_xml(cls, xml):
+    def from_xml(cls, xml, yaml=None):
         geo = xml.find("mxGeometry")
         x = geo.get("x", 0)
         y = geo.get("y", 0)
@@ -421,7 +576,10 @@ class Camera(Object2D):
         type = xml.get("value").split(":")[1]
         id = xml.get("id")
 
-        return cls(type, id, x ,y , width, height)
+        #Optional camera settings from yaml 
+        fps = (yaml or {}).get(type, {}).get("fps", 1)
+
+        return cls(type, id, x ,y , width, height, fps=fps)
 
 class ROI(Object2D):
     def __init__(self, type, gid, x, y, width, height, parent):
@@ -465,6 +623,39 @@ class ROI(Object2D):
         y = y + parent.y
         return cls(type, id, x, y, width, height, parent)
 
+class Tripwire(Object2D):
+    """Line segment inside a camera. Objects crossing the line generate tripwire events."""
+    def __init__(self, type, gid, x1, y1, x2, y2, parent):
+        super().__init__(type, gid, min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1))
+        self.parent = parent #parent camera
+
+        #line end points. Crossing from the left to the right side when looking from x1,y1 towards x2,y2 is an "IN" event 
+        self.x1 = float(x1)
+        self.y1 = float(y1)
+        self.x2 = float(x2)
+        self.y2 = float(y2)
+
+    @property
+    def segment(self):
+        return (self.x1, self.y1, self.x2, self.y2)
+
+    @classmethod
+    def from_xml(cls, xml, parent):
+        """Create Tripwire Object from an XML edge with a source and target point"""
+        geo = xml.find("mxGeometry")
+        points = {point.get("as"): point for point in geo.findall("mxPoint")}
+        if "sourcePoint" not in points or "targetPoint" not in points:
+            raise Exception(f"The tripwire {xml.get('value')} must be a line with a start and end point. Ensure the line is not connected to any components.")
+
+        x1 = float(points["sourcePoint"].get("x", 0)) + parent.x
+        y1 = float(points["sourcePoint"].get("y", 0)) + parent.y
+        x2 = float(points["targetPoint"].get("x", 0)) + parent.x
+        y2 = float(points["targetPoint"].get("y", 0)) + parent.y
+        type = xml.get("value").split(":")[1]
+        id = xml.get("id")
+
+        return cls(type, id, x1, y1, x2, y2, parent)
+
 
 @dataclass 
 class State2D:
@@ -479,4 +670,19 @@ class State2D:
     cameras: dict[str, Object2D]
     items: list[Object2D]
     height: float 
-    width: float 
\ No newline at end of file
+    width: float
+    tripwires: dict[str, Object2D] = field(default_factory=dict)
+    fleets: dict[str, Fleet] = field(default_factory=dict) #movers of each drawio edge. The simulator updates movers through their fleet 
+    item_tracker: dict[str, Object2D] = field(default_factory=dict) #all items of this scene by gid 
+
+    def __post_init__(self):
+        #Items made by the processes of this scene are tracked separately from other scenes 
+        for process in self.processes.values():
+            process.item_tracker = self.item_tracker 
+
+        #The simulator only steps fleets. Plain movers are taken over by a fleet of one 
+        for gid, mover in list(self.movers.items()):
+            if not isinstance(mover, FleetMover):
+                fleet = Fleet.from_mover(mover)
+                self.fleets[gid] = fleet 
+                self.movers[gid] = fleet.movers[0] 
\ No newline at end of file
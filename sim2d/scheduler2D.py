@@ -0,0 +1,40 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from fractions import Fraction
+from functools import lru_cache
+import math 
+
+@lru_cache(maxsize=1024)
+def sample_times(fps, tick):
+    """Samples of a sensor running at fps that fall inside a timestep 
+
+    Timestep `tick` covers the simulated time (tick - 1, tick]. Sample k >= 0 is taken at time k / fps. 
+    A sensor at 1 fps is sampled once at the end of every timestep, a sensor at 0.2 fps at the end of every 
+    5th timestep and a sensor at 30 fps 30 times per timestep. 
+
+    returns
+    list of (frame number, fraction of the timestep) where a fraction of 1.0 is the end of the timestep 
+    """
+    rate = Fraction(fps).limit_denominator(1000)
+    first = max(math.floor((tick - 1) * rate) + 1, 0) #the simulation starts at time 0
+    last = math.floor(tick * rate)
+    return tuple((k, float(k / rate - (tick - 1))) for k in range(first, last + 1))
@@ -0,0 +1,245 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Long running simulation server. Scenes are parsed once and simulation jobs run in a pool of worker 
+processes that is forked after the scenes and libraries are loaded, so jobs do not pay for startup. 
+
+Scenes are listed in a yaml file: 
+
+    scenes:
+      small:
+        diagram: examples/warehouse_small.drawio
+        yaml: examples/warehouse_small.yaml
+        place: city=Austin/building=Warehouse1
+        steady: true
+
+A scene with `steady: true` is simulated once to steady state when it is loaded and every job forks from that state 
+(see steady2D.py). 
+
+Example usage:
+python3 -m sim2d.server2D -c scenes.yaml -w 4 -p 8080 -o runs
+
+curl -X POST localhost:8080/runs -d '{"scene": "small", "seed": 1, "minutes": 60, "output": "small.json", "wait": true}'
+curl localhost:8080/runs/1
+"""
+
+import argparse
+import copy 
+import datetime 
+import json 
+import multiprocessing as mp 
+import os 
+import random 
+import threading 
+import time 
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count 
+import numpy as np 
+import yaml 
+from .simulator2D import Simulator2D
+from .analytics2D import Analytics2D
+from .noise2D import SensorNoise
+from .scene2D import Item 
+from .utils import state_from_files
+
+SCENES = {} #scene name -> {"state": State2D that is never simulated, "diagram", "yaml", "place"}
+
+
+def load_scene(name, diagram, yaml_path, place=None, steady=False):
+    """Parse and validate a scene once. Jobs simulate copies of it. A steady scene is warmed up once here"""
+    SCENES[name] = {"state": state_from_files(diagram, yaml_path), "diagram": diagram, "yaml": yaml_path, 
+                    "place": place or f"scene={name}", "snapshot": None}
+    if steady:
+        from .steady2D import warm_up, take_snapshot
+        sim = Simulator2D(SCENES[name]["state"])
+        print(f"Warming up scene {name}")
+        warm_up(sim)
+        SCENES[name]["snapshot"] = take_snapshot(sim)
+    return SCENES[name]
+
+def _sink(output):
+    """Sink for the output of a job. A URL goes to Elasticsearch, .bin files are binary, None only simulates"""
+    if output is None:
+        return None 
+    if output.startswith("http://") or output.startswith("https://"):
+        from .sinks import ElasticsearchBulkSink
+        return ElasticsearchBulkSink(output)
+    if output.endswith(".bin"):
+        from .wire2D import BinarySink
+        return BinarySink(output)
+    from .sinks import FileSink
+    return FileSink(output)
+
+def run_job(job):
+    """Run one simulation job in a worker. Returns a summary of the run"""
+    started = time.time()
+    scene = SCENES.get(job["scene"])
+    if scene is None: #scenes added after the workers were forked are loaded once per worker 
+        scene = load_scene(job["scene"], job["diagram"], job["yaml"], job.get("place"))
+
+    #The same seed gives the same simulation and records 
+    seed = job.get("seed")
+    timesteps = int(job.get("minutes", 60) * 60)
+    if scene["snapshot"] is not None:
+        from .steady2D import fork
+        sim = fork(scene["snapshot"], seed=seed)
+    else:
+        random.seed(seed)
+        np.random.seed(None if seed is None else seed % 2**32)
+        Item.gid_counter = count()
+        sim = Simulator2D(copy.deepcopy(scene["state"]))
+    sink = _sink(job.get("output"))
+    analytics = None 
+    if sink is not None:
+        start_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=timesteps)
+        noise = SensorNoise.from_yaml(scene["yaml"], seed=seed)
+        analytics = Analytics2D(None, timestamp=start_time, place=job.get("place", scene["place"]), seed=seed, sink=sink, 
+                                rollups=[minutes * 60 for minutes in job.get("rollups", [])], noise=noise)
+
+    for i, state in enumerate(sim.run(timesteps)):
+        if analytics:
+            analytics(state, i)
+    if analytics:
+        analytics.close()
+    return {"scene": job["scene"], "timesteps": timesteps, "output": job.get("output"), "seconds": round(time.time() - started, 3)}
+
+
+class SimulationServer:
+    """Keeps the scenes and the worker pool and tracks the submitted jobs. 
+    
+    Job output files are written inside output_dir. Jobs can only use the scenes of the config unless ad_hoc 
+    is set, which lets jobs load any diagram and yaml file the server can read. 
+    """
+
+    def __init__(self, workers=4, output_dir="runs", ad_hoc=False):
+        self.output_dir = os.path.realpath(output_dir)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.ad_hoc = ad_hoc 
+        #Fork so the workers start with the parsed scenes and imported libraries 
+        context = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else None)
+        self.pool = context.Pool(workers)
+        self.jobs = {} #job id -> AsyncResult 
+        self.job_ids = count(1)
+        self.lock = threading.Lock()
+
+    def output_path(self, output):
+        """Path of a job output inside the output directory. Elasticsearch URLs and None are kept"""
+        if output is None or output.startswith("http://") or output.startswith("https://"):
+            return output 
+        path = os.path.realpath(os.path.join(self.output_dir, output))
+        if os.path.commonpath([path, self.output_dir]) != self.output_dir or path == self.output_dir:
+            raise Exception(f"The output {output} is outside of the output directory {self.output_dir}.")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path 
+
+    def submit(self, job):
+        """Start a job and return its id"""
+        job["output"] = self.output_path(job.get("output"))
+        if job.get("scene") not in SCENES:
+            if not self.ad_hoc:
+                raise Exception(f"Unknown scene {job.get('scene')}. Use a scene from the server config. Start the server with --ad_hoc to allow 'diagram' and 'yaml' paths.")
+            if "diagram" not in job or "yaml" not in job:
+                raise Exception(f"Unknown scene {job.get('scene')}. Use a scene from the server config or supply 'diagram' and 'yaml'.")
+            job.setdefault("scene", f"{job['diagram']}|{job['yaml']}")
+        with self.lock:
+            job_id = next(self.job_ids)
+            self.jobs[job_id] = self.pool.apply_async(run_job, (job,))
+        return job_id 
+
+    def status(self, job_id, wait=False):
+        result = self.jobs.get(job_id)
+        if result is None:
+            return None 
+        if wait:
+            result.wait()
+        if not result.ready():
+            return {"id": job_id, "status": "running"}
+        if not result.successful():
+            try:
+                result.get()
+            except Exception as e:
+                return {"id": job_id, "status": "failed", "error": str(e)}
+        return {"id": job_id, "status": "done", **result.get()}
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+def make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, body):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/scenes":
+                return self._reply(200, {name: {"diagram": scene["diagram"], "yaml": scene["yaml"], "place": scene["place"], 
+                                              "steady": scene["snapshot"] is not None} for name, scene in SCENES.items()})
+            if self.path.startswith("/runs/") and self.path[6:].isdigit():
+                status = server.status(int(self.path[6:]))
+                return self._reply(200, status) if status else self._reply(404, {"error": "unknown run"})
+            self._reply(404, {"error": "unknown path"})
+
+        def do_POST(self):
+            if self.path != "/runs":
+                return self._reply(404, {"error": "unknown path"})
+            try:
+                job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                job_id = server.submit(job)
+            except Exception as e:
+                return self._reply(400, {"error": str(e)})
+            self._reply(200, server.status(job_id, wait=job.get("wait", False)))
+
+        def log_message(self, format, *args):
+            pass 
+    return Handler 
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulation server that keeps scenes loaded and runs jobs in a worker pool")
+    parser.add_argument('-c', "--config", required=False, type=str, default=None, help="Path to the yaml file listing the scenes to load at startup")
+    parser.add_argument('-w', "--workers", required=False, type=int, default=4, help="Number of worker processes")
+    parser.add_argument('-p', "--port", required=False, type=int, default=8080, help="Port to listen on. The server only listens on localhost")
+    parser.add_argument('-o', "--output_dir", required=False, type=str, default="runs", help="Directory for the output files of jobs. Outputs outside of it are rejected")
+    parser.add_argument("--ad_hoc", required=False, action="store_true", help="Allow jobs to load scenes that are not in the config from 'diagram' and 'yaml' paths")
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config, "r") as f:
+            scenes = yaml.full_load(f)["scenes"]
+        for name, scene in scenes.items():
+            load_scene(name, scene["diagram"], scene["yaml"], scene.get("place"), scene.get("steady", False))
+
+    server = SimulationServer(args.workers, args.output_dir, args.ad_hoc)
+    httpd = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(server))
+    print(f"Serving {len(SCENES)} scenes with {args.workers} workers on http://127.0.0.1:{args.port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass 
+    httpd.server_close()
+    server.close()
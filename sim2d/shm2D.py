@@ -0,0 +1,243 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Shared memory ring buffer with the state of every timestep for consumers in other processes. 
+
+The simulator process publishes with a ShmPublisher observer and consumers attach with ShmReader by name. 
+Readers never block the simulator. A reader that falls more than `slots` timesteps behind loses those timesteps. 
+
+Layout version 2, little endian: 
+
+    header:  magic b"SIM2DSHM", version u32, slots u32, slot size u32, padding u32, timesteps published u64
+    slot:    sequence u64 (odd while the slot is written), tick u64, payload size u32, padding u32, payload 
+    payload: string count u32, string bytes u32, strings joined by "\n" (padded to 4 bytes),
+             object count u32, id u32[n], type u32[n], x f32[n], y f32[n],
+             sensor count u32, id u32[s], name u32[s], detection count u32[s], object index u32[sum of counts]
+
+ids, types and sensor ids and names are indices into the strings of the payload. Objects are all movers and the items 
+detected by a camera or ROI. Sensors are keyed by id because cameras and ROIs can share a name. 
+
+Example monitor: 
+python3 -m sim2d.shm2D sim2d
+"""
+
+import struct 
+import time 
+import numpy as np 
+from multiprocessing import shared_memory 
+
+MAGIC = b"SIM2DSHM"
+VERSION = 2
+HEADER = struct.Struct("<8sIIIIQ")
+SLOT_HEADER = struct.Struct("<QQII")
+
+
+class ShmPublisher:
+    """Simulator observer that writes a compact copy of every timestep into a shared memory ring buffer"""
+
+    def __init__(self, name="sim2d", slots=64, slot_size=1 << 20):
+        self.slots = slots 
+        self.slot_size = slot_size #bytes per slot including the slot header 
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size + slots * slot_size)
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, slots, slot_size, 0, 0)
+
+    def _payload(self, state):
+        strings = {}
+        def index(s):
+            return strings.setdefault(s, len(strings))
+
+        #Movers and the items seen by a sensor 
+        sensors = list(state.cameras.values()) + list(state.rois.values())
+        objects = dict(state.movers)
+        for sensor in sensors:
+            for obj in sensor.detections:
+                objects.setdefault(obj.gid, obj)
+        row = {gid: i for i, gid in enumerate(objects)}
+
+        n = len(objects)
+        ids = np.fromiter((index(gid) for gid in objects), dtype="<u4", count=n)
+        types = np.fromiter((index(obj.type) for obj in objects.values()), dtype="<u4", count=n)
+        x = np.fromiter((obj.x for obj in objects.values()), dtype="<f4", count=n)
+        y = np.fromiter((obj.y for obj in objects.values()), dtype="<f4", count=n)
+
+        sensor_ids = np.array([index(sensor.gid) for sensor in sensors], dtype="<u4")
+        names = np.array([index(sensor.type) for sensor in sensors], dtype="<u4")
+        counts = np.array([len(sensor.detections) for sensor in sensors], dtype="<u4")
+        members = np.array([row[obj.gid] for sensor in sensors for obj in sensor.detections], dtype="<u4")
+
+        text = "\n".join(strings).encode()
+        text += b"\0" * (-len(text) % 4)
+        return b"".join([struct.pack("<II", len(strings), len(text)), text, 
+                         struct.pack("<I", n), ids.tobytes(), types.tobytes(), x.tobytes(), y.tobytes(),
+                         struct.pack("<I", len(sensors)), sensor_ids.tobytes(), names.tobytes(), counts.tobytes(), members.tobytes()])
+
+    def __call__(self, state, tick):
+        payload = self._payload(state)
+        if SLOT_HEADER.size + len(payload) > self.slot_size:
+            raise Exception(f"The state of timestep {tick} needs {SLOT_HEADER.size + len(payload)} bytes but the shared memory slots hold {self.slot_size} bytes. Increase slot_size.")
+
+        #Seqlock: the sequence is odd while the slot is written so readers can detect torn reads 
+        buf = self.shm.buf 
+        offset = HEADER.size + (tick % self.slots) * self.slot_size 
+        sequence = struct.unpack_from("<Q", buf, offset)[0]
+        struct.pack_into("<Q", buf, offset, sequence + 1)
+        start = offset + SLOT_HEADER.size 
+        buf[start:start + len(payload)] = payload 
+        SLOT_HEADER.pack_into(buf, offset, sequence + 2, tick, len(payload), 0)
+        struct.pack_into("<Q", buf, HEADER.size - 8, tick + 1)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ShmFrame:
+    """One timestep read from the ring buffer. Arrays are views into shared memory unless copied"""
+
+    def __init__(self, tick, strings, ids, types, x, y, sensors, names):
+        self.tick = tick 
+        self.strings = strings 
+        self.ids = ids #string index of every object 
+        self.types = types #string index of every object type 
+        self.x = x 
+        self.y = y 
+        self.sensors = sensors #sensor id -> object rows detected by the sensor 
+        self.names = names #sensor id -> sensor name 
+
+    def objects(self):
+        """List of (id, type, x, y) of every object"""
+        return [(self.strings[i], self.strings[t], float(x), float(y)) for i, t, x, y in zip(self.ids, self.types, self.x, self.y)]
+
+    def sensor_ids(self, name):
+        """Ids of the sensors with a name. A camera and an ROI can have the same name"""
+        return [gid for gid, sensor_name in self.names.items() if sensor_name == name]
+
+    def detections(self, sensor):
+        """Ids of the objects detected by a sensor, given by id or by a name that only one sensor has"""
+        if sensor not in self.sensors:
+            matches = self.sensor_ids(sensor)
+            if len(matches) != 1:
+                raise Exception(f"{len(matches)} sensors are named {sensor}. Pass one of the sensor ids {matches} instead.")
+            sensor = matches[0]
+        return [self.strings[self.ids[row]] for row in self.sensors[sensor]]
+
+
+class ShmReader:
+    """Reads timesteps published by a ShmPublisher in another process"""
+
+    def __init__(self, name="sim2d"):
+        self.shm = shared_memory.SharedMemory(name=name)
+        try: #only the publisher should remove the shared memory 
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass 
+
+        magic, version, self.slots, self.slot_size, _, _ = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC:
+            raise Exception(f"Shared memory {name} was not written by a ShmPublisher.")
+        if version != VERSION:
+            raise Exception(f"Shared memory {name} has layout version {version} but this reader supports version {VERSION}.")
+        self.last = -1 #last tick returned by next_frame 
+
+    @property
+    def published(self):
+        """Number of timesteps published so far"""
+        return struct.unpack_from("<Q", self.shm.buf, HEADER.size - 8)[0]
+
+    def read(self, tick, copy=True):
+        """Frame of a timestep or None if it was overwritten or is being written. 
+        
+        With copy=False the arrays are views into shared memory that stay valid until the slot is reused 
+        `slots` timesteps later. Check with valid(frame). 
+        """
+        buf = self.shm.buf 
+        offset = HEADER.size + (tick % self.slots) * self.slot_size 
+        sequence, slot_tick, size, _ = SLOT_HEADER.unpack_from(buf, offset)
+        if sequence % 2 or slot_tick != tick:
+            return None 
+
+        data = buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + size]
+        if copy:
+            data = bytes(data)
+        count, length = struct.unpack_from("<II", data, 0)
+        strings = bytes(data[8:8 + length]).rstrip(b"\0").decode().split("\n") if count else []
+
+        pos = 8 + length 
+        n = struct.unpack_from("<I", data, pos)[0]
+        arrays = [np.frombuffer(data, dtype=dtype, count=n, offset=pos + 4 + k * 4 * n) for k, dtype in enumerate(("<u4", "<u4", "<f4", "<f4"))]
+        pos += 4 + 16 * n 
+
+        s = struct.unpack_from("<I", data, pos)[0]
+        sensor_ids = np.frombuffer(data, dtype="<u4", count=s, offset=pos + 4)
+        names = np.frombuffer(data, dtype="<u4", count=s, offset=pos + 4 + 4 * s)
+        counts = np.frombuffer(data, dtype="<u4", count=s, offset=pos + 4 + 8 * s)
+        members = np.frombuffer(data, dtype="<u4", count=int(counts.sum()), offset=pos + 4 + 12 * s)
+        bounds = np.concatenate([[0], np.cumsum(counts)]).astype(int)
+        sensors = {strings[gid]: members[bounds[i]:bounds[i + 1]] for i, gid in enumerate(sensor_ids)}
+        names = {strings[gid]: strings[name] for gid, name in zip(sensor_ids, names)}
+
+        frame = ShmFrame(tick, strings, *arrays, sensors, names)
+        if not self.valid(frame): #the slot was rewritten while it was read 
+            return None 
+        return frame 
+
+    def valid(self, frame):
+        """True if the slot of the frame has not been rewritten"""
+        offset = HEADER.size + (frame.tick % self.slots) * self.slot_size 
+        sequence, slot_tick, _, _ = SLOT_HEADER.unpack_from(self.shm.buf, offset)
+        return sequence % 2 == 0 and slot_tick == frame.tick 
+
+    def next_frame(self, latest=True, timeout=None, poll=0.001):
+        """Wait for a timestep after the last one returned. With latest=True skipped timesteps are dropped 
+        so a slow reader always gets the newest state. Returns None on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout 
+        while True:
+            published = self.published 
+            if published - 1 > self.last:
+                tick = published - 1 if latest else max(self.last + 1, published - self.slots + 1)
+                frame = self.read(tick)
+                if frame is not None:
+                    self.last = tick 
+                    return frame 
+            if deadline is not None and time.monotonic() > deadline:
+                return None 
+            time.sleep(poll)
+
+    def close(self):
+        self.shm.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Print the number of objects and detections of the newest timesteps in a shared memory ring buffer")
+    parser.add_argument("name", nargs="?", default="sim2d", help="Name of the shared memory")
+    parser.add_argument('-t', "--timeout", type=float, default=5, help="Stop after this many seconds without a new timestep")
+    args = parser.parse_args()
+
+    reader = ShmReader(args.name)
+    while True:
+        frame = reader.next_frame(timeout=args.timeout)
+        if frame is None:
+            break 
+        print(frame.tick, len(frame.ids), {f"{frame.names[sensor]} ({sensor})": len(rows) for sensor, rows in frame.sensors.items()})
+    reader.close()
@@ -21,46 +21,78 @@
 
 from itertools import chain
 from .scene2D import Item 
+from .scheduler2D import sample_times
 
 class Simulator2D:
     
-    def __init__(self, state):
+    def __init__(self, state, observers=None):
         self.state = state 
+        self.tick = 0 #number of timesteps simulated 
+        self.observers = list(observers or []) #called with (state, tick) after every timestep 
+        self.sensor_processes = None #sensor id -> processes that overlap the sensor. Built on the first timestep 
 
     def add_object(self, object):
         self.objects.append(object)
 
     def timestep(self):
 
-        #handle movers
-        for id, mover in self.state.movers.items():
-            mover()
-            #print(mover.info())
+        #handle movers. Every fleet updates all of its movers at once 
+        for id, fleet in self.state.fleets.items():
+            fleet()
 
         #handle processes 
         for id, process in self.state.processes.items():
             process()
 
-        Item.remove() #cleanup used items 
-        self.state.items = Item.item_tracker #Update item list
+        self.state.items = list(self.state.item_tracker.values()) #Update item list
 
-        #Update item positions
-        for item in self.state.items:
-            item() 
-
-        #handle camera detections
+        #handle camera detections. Cameras are only evaluated when they take a frame in this timestep 
         for id, camera in self.state.cameras.items():
-            objs = list(chain(self.state.movers.values(), self.state.items))
-            camera(objs)
+            camera.sampled = bool(sample_times(camera.fps, self.tick))
+            if camera.sampled:
+                camera(self._observable(camera))
             
         #handle rois detections 
         for id, roi in self.state.rois.items():
-            objs = list(chain(self.state.movers.values(), self.state.items))
-            roi(objs)
+            if roi.parent.sampled:
+                roi(self._observable(roi))
 
+        for observer in self.observers:
+            observer(self.state, self.tick)
+        self.tick += 1
 
         return self.state 
 
+    def invalidate(self):
+        """Recompute cached scene information on the next timestep. Call after adding or moving processes or sensors"""
+        self.sensor_processes = None 
+
+    def _observable(self, sensor):
+        """Movers and the items that can be inside the sensor 
+        
+        Items are always inside their parent so only the items of processes and movers that overlap the sensor 
+        are tested. Positions of all other items are never computed.
+        """
+        if self.sensor_processes is None:
+            sensors = chain(self.state.cameras.values(), self.state.rois.values())
+            self.sensor_processes = {s.gid: [p for p in self.state.processes.values() if s.overlaps(p, margin=Item.size)] for s in sensors}
+
+        movers = list(self.state.movers.values())
+        parents = self.sensor_processes[sensor.gid] + [m for fleet in self.state.fleets.values() for m in fleet.overlapping(sensor, margin=Item.size)]
+        items = [item for parent in parents for item_list in parent.inventory.items.values() for item in item_list]
+        return movers + items 
+
+    def add_observer(self, observer):
+        """Register a callable that is called with (state, tick) after every timestep"""
+        self.observers.append(observer)
+
+    def run(self, steps=None):
+        """Lazily step the simulator. Yields the state after every timestep. Runs forever if steps is None"""
+        timestep = 0
+        while steps is None or timestep < steps:
+            yield self.timestep()
+            timestep += 1
+
     def register_movement(self, function, type):
         for obj in self.objects:
             if obj.type==type:
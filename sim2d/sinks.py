@@ -0,0 +1,248 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import calendar 
+import http.client
+import json 
+import queue 
+import threading 
+import time 
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+class FileSink:
+    """Writes ELK index records to a file as JSON lines. This is the ELK dump format.
+
+    Unless index is False, a sidecar file `path + ".idx"` maps (time bucket, sensorId, index) to the byte 
+    offsets of the records so tools/replay_elk.py can read a time window without scanning the dump. 
+    The first line of the sidecar is a JSON header {"version": 1, "bucket": seconds per bucket}. Every other 
+    line is a JSON list [bucket start in epoch seconds, sensorId, index, [offsets]]. 
+    The same key can appear on several lines, for example when behavior records of an old bucket are 
+    written late. 
+    """
+
+    def __init__(self, path, index=True, bucket=60):
+        self.path = path 
+        self.file = open(path, "wb+")
+        self.offset = 0 #byte offset of the next record 
+
+        self.index_file = open(f"{path}.idx", "w+") if index else None 
+        self.bucket = bucket #seconds per time bucket of the index 
+        if self.index_file is not None:
+            self.index_file.write(json.dumps({"version": 1, "bucket": bucket}) + "\n")
+        self.entries = {} #(bucket, sensorId, index) -> offsets not yet written to the index file 
+        self.current_bucket = None 
+        self.last_timestamp = (None, None) #timestamp string, bucket. Records of a timestep share timestamps 
+
+    def write(self, record):
+        line = record.model_dump_json(by_alias=True)
+        if self.index_file is None:
+            return self.write_line(line)
+        self._index(record.source.timestamp, record.source.sensorId, record.index)
+        self._write(line)
+
+    def write_line(self, line):
+        """Write a record that is already encoded as an ELK JSON line"""
+        if self.index_file is not None:
+            record = json.loads(line)
+            self._index(record["_source"]["timestamp"], record["_source"]["sensorId"], record["_index"])
+        self._write(line)
+
+    def _write(self, line):
+        data = (line + "\n").encode()
+        self.file.write(data)
+        self.offset += len(data)
+
+    def _index(self, timestamp, sensor_id, index):
+        if timestamp != self.last_timestamp[0]:
+            seconds = calendar.timegm(time.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S"))
+            self.last_timestamp = (timestamp, seconds - seconds % self.bucket)
+        bucket = self.last_timestamp[1]
+
+        #Write out the offsets of older buckets once the records move on to a new bucket 
+        if self.current_bucket is None or bucket > self.current_bucket:
+            self._flush_index()
+            self.current_bucket = bucket 
+        self.entries.setdefault((bucket, sensor_id, index), []).append(self.offset)
+
+    def _flush_index(self):
+        for (bucket, sensor_id, index), offsets in self.entries.items():
+            self.index_file.write(json.dumps([bucket, sensor_id, index, offsets]))
+            self.index_file.write("\n")
+        self.entries = {}
+
+    def close(self):
+        self.file.close()
+        if self.index_file is not None:
+            self._flush_index()
+            self.index_file.close()
+
+
+class BufferSink:
+    """Keeps ELK index records in memory as JSON lines until they are drained"""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, record):
+        self.lines.append(record.model_dump_json(by_alias=True))
+
+    def write_line(self, line):
+        self.lines.append(line)
+
+    def drain(self):
+        """Return and forget the buffered lines"""
+        lines, self.lines = self.lines, []
+        return lines 
+
+    def close(self):
+        pass 
+
+
+class ElasticsearchBulkSink:
+    """Sends ELK index records to Elasticsearch with the bulk API
+
+    Records are grouped in batches of batch_size documents. Up to max_in_flight batches are sent concurrently 
+    over a pool of keep-alive connections. Batches or documents rejected because Elasticsearch is busy 
+    (429/502/503/504) are retried with exponential backoff. 
+    """
+
+    retry_status = (429, 502, 503, 504)
+
+    def __init__(self, url, batch_size=1000, max_in_flight=4, retries=5, backoff=0.5, timeout=30):
+        url = urlsplit(url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 9200)
+        self.https = url.scheme == "https"
+        self.path = url.path.rstrip("/") + "/_bulk"
+        self.headers = {"Content-Type": "application/x-ndjson", "Connection": "keep-alive"}
+
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff #seconds to wait before the first retry. Doubles every retry 
+        self.timeout = timeout 
+
+        #One keep-alive connection per in flight request 
+        self.connections = queue.Queue()
+        for _ in range(max_in_flight):
+            self.connections.put(self._connect())
+        self.in_flight = threading.BoundedSemaphore(max_in_flight) #blocks the simulator when Elasticsearch can't keep up 
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self.futures = []
+
+        self.batch = []
+        self.sent = 0 #documents indexed 
+        self.failed = 0 #documents rejected by elasticsearch 
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def write(self, record):
+        action = json.dumps({"index": {"_index": record.index, "_id": record.id}})
+        self._add(action, record.source.model_dump_json())
+
+    def write_line(self, line):
+        """Write a record that is already encoded as an ELK JSON line"""
+        record = json.loads(line)
+        action = json.dumps({"index": {"_index": record["_index"], "_id": record["_id"]}})
+        self._add(action, json.dumps(record["_source"]))
+
+    def _add(self, action, source):
+        self.batch.append(f"{action}\n{source}\n")
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send the current batch in the background"""
+        if not self.batch:
+            return 
+        batch, self.batch = self.batch, []
+
+        self.in_flight.acquire()
+        future = self.executor.submit(self._send, batch)
+        future.add_done_callback(lambda _: self.in_flight.release())
+        #Surface errors of finished requests 
+        for done in [f for f in self.futures if f.done()]:
+            if done.exception():
+                raise done.exception()
+        self.futures = [f for f in self.futures if not f.done()]
+        self.futures.append(future)
+
+    def _send(self, batch):
+        """Send a batch, retrying the documents that could not be indexed"""
+        connection = self.connections.get()
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+
+                try:
+                    connection.request("POST", self.path, body="".join(batch).encode(), headers=self.headers)
+                    response = connection.getresponse()
+                    body = response.read()
+                except (OSError, http.client.HTTPException):
+                    connection.close() #reconnects on the next request 
+                    continue 
+
+                if response.status in self.retry_status:
+                    continue 
+                if response.status >= 300:
+                    raise Exception(f"Elasticsearch bulk request failed with status {response.status}: {body[:200]}")
+
+                #Keep the documents that should be retried 
+                result = json.loads(body)
+                retry = []
+                failed = 0
+                if result.get("errors"):
+                    for doc, item in zip(batch, result["items"]):
+                        status = next(iter(item.values())).get("status", 200)
+                        if status in self.retry_status:
+                            retry.append(doc)
+                        elif status >= 300:
+                            failed += 1 
+
+                with self.lock:
+                    self.sent += len(batch) - len(retry) - failed
+                    self.failed += failed 
+                if not retry:
+                    return 
+                batch = retry 
+
+            raise Exception(f"Elasticsearch bulk request failed after {self.retries} retries. {len(batch)} documents were not indexed.")
+        finally:
+            self.connections.put(connection)
+
+    def close(self):
+        """Send remaining records and wait for all requests to finish"""
+        self.flush()
+        self.executor.shutdown(wait=True)
+        while not self.connections.empty():
+            self.connections.get().close()
+
+        for future in self.futures:
+            if future.exception():
+                raise future.exception()
+
+        if self.failed:
+            print(f"Elasticsearch rejected {self.failed} documents")
@@ -0,0 +1,191 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Run many sites (drawio/yaml pairs) in one program with one shared output and a shared pool of worker processes.
+
+Sites are listed in a yaml file:
+
+    sites:
+      - diagram: examples/warehouse_small.drawio
+        yaml: examples/warehouse_small.yaml
+        place: city=Austin/building=Warehouse1
+      - diagram: examples/warehouse_large.drawio
+        yaml: examples/warehouse_large.yaml
+        place: city=Austin/building=Warehouse2
+
+Example usage:
+python3 -m sim2d.sites2D -c sites.yaml -t 60 -w 4
+"""
+
+import argparse
+import datetime 
+import multiprocessing as mp 
+from itertools import count 
+import yaml 
+from .simulator2D import Simulator2D
+from .analytics2D import Analytics2D
+from .sinks import BufferSink, FileSink
+from .noise2D import SensorNoise
+from .scene2D import Item 
+from .utils import state_from_files
+
+SITE_IDS = 10**9 #item ids of each site start at a multiple of this 
+
+
+def prefix_gids(state, prefix):
+    """Prefix the drawio ids of all components. Sites built from the same diagram then have different object ids"""
+    for name in ("processes", "cameras", "rois", "tripwires", "fleets"):
+        objects = getattr(state, name)
+        for obj in objects.values():
+            obj.gid = prefix + obj.gid 
+        setattr(state, name, {obj.gid: obj for obj in objects.values()})
+    for mover in state.movers.values():
+        mover.gid = prefix + mover.gid 
+    state.movers = {mover.gid: mover for mover in state.movers.values()}
+    return state 
+
+
+class Site:
+    """One scene with its own simulator and analytics. Records are buffered until they are drained"""
+
+    def __init__(self, index, diagram, yaml, place, start_time, seed=None):
+        self.name = place 
+        self.sim = Simulator2D(prefix_gids(state_from_files(diagram, yaml), f"site{index}-"))
+        self.gid_counter = count(index * SITE_IDS) #item ids stay unique when sites run in different processes 
+        site_seed = None if seed is None else seed * 1000003 + index #different record ids for every site 
+        noise = SensorNoise.from_yaml(yaml, seed=site_seed)
+        self.analytics = Analytics2D(None, timestamp=start_time, place=place, seed=site_seed, sink=BufferSink(), noise=noise)
+        self.timestep = 0 
+
+    def step(self, n):
+        """Simulate n timesteps and return the encoded records"""
+        Item.gid_counter = self.gid_counter 
+        for _ in range(n):
+            self.analytics(self.sim.timestep(), self.timestep)
+            self.timestep += 1 
+        return self.analytics.sink.drain()
+
+    def close(self):
+        self.analytics.close()
+        return self.analytics.sink.drain()
+
+
+def load_sites(config_path):
+    """Read the list of sites from a yaml file"""
+    with open(config_path, "r") as f:
+        sites = yaml.full_load(f)["sites"]
+
+    for i, site in enumerate(sites):
+        for key in ("diagram", "yaml"):
+            if key not in site:
+                raise Exception(f"Site {i} in {config_path} has no '{key}' key. Every site requires 'diagram' and 'yaml'.")
+        site.setdefault("place", f"site={i}")
+    return sites 
+
+def _worker(conn, sites, start_time, seed):
+    """Worker process. Hosts several sites and steps them when the runner asks for it"""
+    sites = [Site(index, site["diagram"], site["yaml"], site["place"], start_time, seed) for index, site in sites]
+    while True:
+        n = conn.recv()
+        if n is None:
+            conn.send([line for site in sites for line in site.close()])
+            return 
+        conn.send([line for site in sites for line in site.step(n)])
+
+
+class MultiSiteRunner:
+    """Steps many sites together and writes all of their records to one sink
+
+    With workers=0 every site runs in this process. Otherwise the sites are spread over a pool of worker 
+    processes that each host several sites, so the per process startup is paid per worker and not per site.
+    Sites are stepped in chunks of `chunk` timesteps to keep the communication between processes low. 
+    """
+
+    def __init__(self, sites, sink, start_time=None, workers=0, chunk=60, seed=None):
+        self.sink = sink 
+        self.chunk = chunk 
+        start_time = start_time or datetime.datetime.utcnow()
+
+        self.sites = []
+        self.workers = []
+        if workers == 0:
+            self.sites = [Site(i, site["diagram"], site["yaml"], site["place"], start_time, seed) for i, site in enumerate(sites)]
+            return 
+
+        #Spread the sites evenly over the workers 
+        workers = min(workers, len(sites))
+        for w in range(workers):
+            parent_conn, child_conn = mp.Pipe()
+            assigned = [(i, site) for i, site in enumerate(sites) if i % workers == w]
+            process = mp.Process(target=_worker, args=(child_conn, assigned, start_time, seed), daemon=True)
+            process.start()
+            self.workers.append((process, parent_conn))
+
+    def _step(self, n):
+        """Step every site n timesteps. None closes the sites"""
+        for _, conn in self.workers:
+            conn.send(n)
+        for site in self.sites:
+            self._write(site.step(n) if n is not None else site.close())
+        for _, conn in self.workers:
+            self._write(conn.recv())
+
+    def _write(self, lines):
+        for line in lines:
+            self.sink.write_line(line)
+
+    def run(self, steps):
+        """Simulate all sites for a number of timesteps"""
+        for start in range(0, steps, self.chunk):
+            self._step(min(self.chunk, steps - start))
+            yield start + min(self.chunk, steps - start)
+
+    def close(self):
+        """Write out remaining records, stop the workers and close the sink"""
+        self._step(None)
+        for process, _ in self.workers:
+            process.join()
+        self.sink.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate many sites with one shared output")
+    parser.add_argument('-c', "--config", required=True, type=str, help="Path to the yaml file listing the sites")
+    parser.add_argument('-t', "--time", required=False, type=int, default=60, help="Number of minutes to generate synthetic data for")
+    parser.add_argument('-w', "--workers", required=False, type=int, default=0, help="Number of worker processes. 0 runs all sites in this process")
+    parser.add_argument('-o', "--output", required=False, type=str, default="mdx_elk.json", help="Path of the ELK dump")
+    parser.add_argument('-e', "--elastic", required=False, type=str, default=None, help="Elasticsearch URL. If supplied, records are sent to Elasticsearch instead of the output file")
+    parser.add_argument('-s', "--seed", required=False, type=int, default=None, help="Seed for the analytics record ids")
+    args = parser.parse_args()
+
+    timesteps = args.time * 60
+    if args.elastic:
+        from .sinks import ElasticsearchBulkSink
+        sink = ElasticsearchBulkSink(args.elastic)
+    else:
+        sink = FileSink(args.output)
+
+    start_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=timesteps)
+    runner = MultiSiteRunner(load_sites(args.config), sink, start_time=start_time, workers=args.workers, seed=args.seed)
+    for done in runner.run(timesteps):
+        print(f"{done // 60} minutes have been generated")
+    runner.close()
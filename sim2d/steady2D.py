@@ -0,0 +1,135 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Steady state detection and warm snapshots. 
+
+Scenes start with empty inventories, so the first part of a run is warm-up that does not look like a running site. 
+SteadyStateDetector watches the number of items in the scene and the batches completed by all processes, both summed 
+over batches of `window` timesteps. The scene is steady once, over the last `batches` batches, both the throughput and 
+the inventory stay within `tolerance` of their mean. Overloaded processes whose queues grow without bound never reach 
+a steady state, so their warm-up ends at the step limit with a warning that reports the growth. 
+
+A steady state can be snapshotted once and many seeded runs forked from it, so runs do not pay the warm-up again. 
+"""
+
+import copy 
+import pickle 
+import random 
+from itertools import count 
+import numpy as np 
+from .simulator2D import Simulator2D
+from .scene2D import Item 
+
+
+class SteadyStateDetector:
+    """Simulator observer that decides when inventory levels and throughput stop drifting"""
+
+    def __init__(self, window=600, batches=4, tolerance=0.2):
+        self.window = window #timesteps per batch. Should cover the longest cycle of the scene (e.g. trailer arrivals) 
+        self.batches = batches #number of consecutive batches that have to agree 
+        self.tolerance = tolerance #allowed spread of the batches relative to their mean 
+        self.ticks = 0
+        self.steady = False 
+        self.steady_tick = None #number of timesteps observed when steady state was reached 
+        self.drift = 0.0 #inventory growth in items per batch over the last batches 
+
+        self.completed = 0 #completed batches of all processes at the last timestep 
+        self.sums = [0.0, 0] #inventory and throughput of the current batch 
+        self.inventory = [] #mean items in the scene of the last batches 
+        self.throughput = [] #batches completed during the last batches 
+
+    def _spread(self, values):
+        """Range of the values relative to their mean"""
+        return (max(values) - min(values)) / max(abs(sum(values) / len(values)), 1.0)
+
+    def _check(self):
+        if len(self.inventory) < self.batches:
+            return False 
+        if self._spread(self.throughput) > self.tolerance:
+            self.drift = 0.0
+            return False 
+
+        #inventory that keeps growing is not steady, whatever the rate 
+        self.drift = float(np.polyfit(np.arange(self.batches), self.inventory, 1)[0])
+        return self._spread(self.inventory) <= self.tolerance 
+
+    def __call__(self, state, tick):
+        completed = sum(process.completed for process in state.processes.values())
+        self.sums[0] += len(state.item_tracker)
+        self.sums[1] += completed - self.completed 
+        self.completed = completed 
+        self.ticks += 1
+
+        if self.ticks % self.window:
+            return 
+        self.inventory = (self.inventory + [self.sums[0] / self.window])[-self.batches:]
+        self.throughput = (self.throughput + [self.sums[1]])[-self.batches:]
+        self.sums = [0.0, 0]
+
+        if not self.steady and self._check():
+            self.steady = True 
+            self.steady_tick = self.ticks 
+
+
+def warm_up(sim, detector=None, max_steps=6 * 3600):
+    """Step the simulator until steady state or max_steps. Returns the number of timesteps simulated"""
+    detector = detector or SteadyStateDetector()
+    sim.add_observer(detector)
+    try:
+        for _ in sim.run(max_steps):
+            if detector.steady:
+                break 
+    finally:
+        sim.observers.remove(detector)
+
+    if not detector.steady and detector.drift > 0:
+        print(f"Warning: no steady state after {detector.ticks} timesteps. Inventories grow by {detector.drift:.0f} items every {detector.window} timesteps. Continuing from here.")
+    elif not detector.steady:
+        print(f"Warning: no steady state after {detector.ticks} timesteps. Continuing from here.")
+    else:
+        print(f"Steady state reached after {detector.ticks} timesteps")
+    sim.tick = 0 #cameras sample like a fresh run so frame ids start at 0 
+    return detector.ticks 
+
+
+def take_snapshot(sim):
+    """Copy of the simulator state that runs can be forked from"""
+    next_gid = next(Item.gid_counter)
+    Item.gid_counter = count(next_gid) #taking the snapshot does not use up an id 
+    return {"state": copy.deepcopy(sim.state), "tick": sim.tick, "next_gid": next_gid}
+
+def save_snapshot(snapshot, path):
+    with open(path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_snapshot(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def fork(snapshot, seed=None, observers=None):
+    """Simulator that continues from a snapshot. Forks with the same seed simulate the same run"""
+    random.seed(seed)
+    np.random.seed(None if seed is None else seed % 2**32)
+    Item.gid_counter = count(snapshot["next_gid"]) #new items never reuse ids of items in the snapshot 
+    sim = Simulator2D(copy.deepcopy(snapshot["state"]), observers)
+    sim.tick = snapshot["tick"]
+    return sim 
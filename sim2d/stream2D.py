@@ -0,0 +1,109 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Streaming API for embedding the simulator in other pipelines. 
+
+Example: 
+
+    sim = Simulator2D(state_from_files("diagram.drawio", "diagram.yaml"))
+    for delta in deltas(sim, steps=3600):
+        ...
+
+    async for lines in astream(records(sim, Analytics2D(None, sink=BufferSink()))):
+        ...
+"""
+
+import asyncio 
+from dataclasses import dataclass 
+
+@dataclass(frozen=True)
+class Snapshot2D:
+    """Copy of the parts of a State2D that change every timestep"""
+    timestep: int
+    movers: dict #mover id -> (type, x, y)
+    inventories: dict #process id -> number of items in the process inventory 
+    cameras: dict #camera name -> tuple of detected object ids 
+    rois: dict #roi name -> tuple of detected object ids 
+
+    @classmethod
+    def from_state(cls, state, timestep):
+        return cls(timestep=timestep, 
+                   movers={gid: (mover.type, mover.x, mover.y) for gid, mover in state.movers.items()},
+                   inventories={gid: process.inventory.size for gid, process in state.processes.items()},
+                   cameras={camera.type: tuple(obj.gid for obj in camera.detections) for camera in state.cameras.values()},
+                   rois={roi.type: tuple(obj.gid for obj in roi.detections) for roi in state.rois.values()})
+
+@dataclass(frozen=True)
+class Delta2D:
+    """Objects that entered or left each camera and ROI during a timestep"""
+    timestep: int
+    entered: dict #sensor name -> tuple of object ids 
+    exited: dict #sensor name -> tuple of object ids 
+
+
+def snapshots(sim, steps=None):
+    """Yield a Snapshot2D after every timestep"""
+    for timestep, state in enumerate(sim.run(steps)):
+        yield Snapshot2D.from_state(state, timestep)
+
+def deltas(sim, steps=None):
+    """Yield a Delta2D after every timestep. Sensors without changes are left out"""
+    previous = {}
+    for timestep, state in enumerate(sim.run(steps)):
+        entered = {}
+        exited = {}
+        for sensor in list(state.cameras.values()) + list(state.rois.values()):
+            current = {obj.gid for obj in sensor.detections}
+            before = previous.get(sensor.gid, set())
+            if current != before:
+                entered[sensor.type] = tuple(current - before)
+                exited[sensor.type] = tuple(before - current)
+            previous[sensor.gid] = current 
+        yield Delta2D(timestep=timestep, entered=entered, exited=exited)
+
+def records(sim, analytics, steps=None):
+    """Yield the encoded ELK records of every timestep as a list of JSON lines
+    
+    analytics must write to a BufferSink. Behavior tracks that are still open are yielded after the last timestep.
+    """
+    for timestep, state in enumerate(sim.run(steps)):
+        analytics(state, timestep)
+        yield analytics.sink.drain()
+
+    analytics.close()
+    yield analytics.sink.drain()
+
+async def astream(iterator, interval=None):
+    """Async iterator over any of the streams above 
+    
+    Timesteps are computed in a worker thread so the event loop stays responsive. 
+    If interval is set, waits interval seconds between results to pace the stream.
+    """
+    done = object()
+    iterator = iter(iterator)
+    while True:
+        result = await asyncio.to_thread(next, iterator, done)
+        if result is done:
+            return 
+        yield result 
+        if interval:
+            await asyncio.sleep(interval)
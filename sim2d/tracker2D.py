@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import numpy as np 
+
+class Tracker2D:
+    """Keeps the previous and current center of every tracked object in arrays so per-tick analytics can be vectorized"""
+
+    def __init__(self):
+        self.ids = []
+        self.rows = {} #gid -> row in the current arrays 
+        self.prev = np.zeros((0, 2))
+        self.curr = np.zeros((0, 2))
+        self.seen = np.zeros(0, dtype=bool) #True if the object was also tracked in the previous tick 
+
+    def __call__(self, objects):
+        """Update the tracker with the objects visible in this tick"""
+        ids = [obj.gid for obj in objects]
+        curr = np.array([obj.center for obj in objects], dtype=float).reshape(-1, 2)
+
+        #Objects seen for the first time start with no motion 
+        old_rows = np.array([self.rows.get(gid, -1) for gid in ids], dtype=int)
+        seen = old_rows >= 0
+        prev = curr.copy()
+        prev[seen] = self.curr[old_rows[seen]]
+
+        self.ids = ids 
+        self.rows = {gid: row for row, gid in enumerate(ids)}
+        self.prev = prev
+        self.curr = curr 
+        self.seen = seen 
+
+    @property
+    def velocity(self):
+        """Displacement of every tracked object since the previous tick"""
+        return self.curr - self.prev
+
+    def lookup(self, objects):
+        """Return the rows of the passed in objects"""
+        return np.array([self.rows[obj.gid] for obj in objects], dtype=int)
+
+
+def segment_crossings(prev, curr, wires):
+    """Find where the motion segments prev -> curr cross the tripwire segments
+
+    input
+    prev, curr (N,2) arrays of object positions 
+    wires (M,4) array of x1,y1,x2,y2 line segments 
+
+    returns
+    crossed (N,M) bool array, entered (N,M) bool array. entered is True when the object moved from 
+    the left to the right side of the line when looking from x1,y1 towards x2,y2 
+    """
+    a = wires[None, :, 0:2]
+    e = wires[None, :, 2:4] - a
+    p = prev[:, None, :]
+    c = curr[:, None, :]
+    d = c - p 
+
+    #side of the wire the object was on before and after moving 
+    side_prev = e[..., 0] * (p[..., 1] - a[..., 1]) - e[..., 1] * (p[..., 0] - a[..., 0])
+    side_curr = e[..., 0] * (c[..., 1] - a[..., 1]) - e[..., 1] * (c[..., 0] - a[..., 0])
+
+    #side of the motion segment each wire end point is on 
+    b = a + e 
+    side_a = d[..., 0] * (a[..., 1] - p[..., 1]) - d[..., 1] * (a[..., 0] - p[..., 0])
+    side_b = d[..., 0] * (b[..., 1] - p[..., 1]) - d[..., 1] * (b[..., 0] - p[..., 0])
+
+    crossed = ((side_prev < 0) != (side_curr < 0)) & (side_a * side_b <= 0)
+    entered = crossed & (side_prev < 0)
+    return crossed, entered
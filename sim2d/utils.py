@@ -19,16 +19,17 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-from .scene2D import State2D, Object2D, Process, Mover, Camera, ROI
+from .scene2D import State2D, Object2D, Process, Fleet, Camera, ROI, Tripwire
+from .routes2D import RoutePlanner
 import xml.etree.ElementTree as ET 
 import yaml 
 
 def _parse_yaml(yaml_file):
-    """Parse YAML file to get mover and process information"""
+    """Parse YAML file to get mover, process and optional camera information"""
     with open(yaml_file, 'r') as f:
         data = yaml.full_load(f) #todo convert to all lower case 
 
-    return data["movers"], data["processes"]
+    return data["movers"], data["processes"], data.get("cameras") or {}
 
 def _parse_xml(xml):
     """Parse XML and to extract all mxCells"""
@@ -51,15 +52,21 @@ def _parse_xml_size(xml):
     height = float(root.find("./diagram/mxGraphModel").get("dy"))
     return width, height
 
+def _is_tripwire(xml):
+    """Tripwires are unconnected lines labelled 'tripwire:X'"""
+    return xml.get("edge") == "1" and xml.get("value", "").lower()[0:9] == "tripwire:"
+
 def _categorize_mxcells(mxcells):
-    """Categorize mxcells and movers, processes, cameras or rois"""
+    """Categorize mxcells and movers, processes, cameras, rois or tripwires"""
 
-    cat_cells = {"movers":[], "processes":[], "cameras":[], "rois":[]}
+    cat_cells = {"movers":[], "processes":[], "cameras":[], "rois":[], "tripwires":[]}
     process_ids = set()
 
     #Determine all mxCells that are edges
     for id, xml in mxcells.items():
-        if "source" in xml.keys() and "target" in xml.keys(): #if true then its a mover (edge)
+        if _is_tripwire(xml):
+            cat_cells["tripwires"].append(xml)
+        elif "source" in xml.keys() and "target" in xml.keys(): #if true then its a mover (edge)
             cat_cells["movers"].append(xml)
             process_ids.add(xml.get("source"))
             process_ids.add(xml.get("target"))
@@ -86,13 +93,15 @@ def state_from_files(xml, yaml):
     width, height = _parse_xml_size(xml)
     cat_cells = _categorize_mxcells(mx_cells)
 
-    movers_yaml, processes_yaml = _parse_yaml(yaml)
+    movers_yaml, processes_yaml, cameras_yaml = _parse_yaml(yaml)
   
     """Convert XML and YAML definitions to 2D Objects """
     movers = {}
+    fleets = {}
     processes = {}
     cameras = {}
     rois = {}
+    tripwires = {}
    
     for process_xml in cat_cells["processes"]:
        id = process_xml.get("id")
@@ -100,21 +109,32 @@ def state_from_files(xml, yaml):
 
     for camera_xml in cat_cells["cameras"]:
         id = camera_xml.get("id")
-        cameras[id] = Camera.from_xml(camera_xml)
+        cameras[id] = Camera.from_xml(camera_xml, cameras_yaml)
 
     for roi_xml in cat_cells["rois"]:
         id = roi_xml.get("id")
         parent_camera = roi_xml.get("parent")
         rois[id] = ROI.from_xml(roi_xml, cameras[parent_camera])
         cameras[parent_camera].rois.append(rois[id])
+
+    for tripwire_xml in cat_cells["tripwires"]:
+        id = tripwire_xml.get("id")
+        parent_camera = tripwire_xml.get("parent")
+        if parent_camera not in cameras:
+            raise Exception(f"The tripwire {tripwire_xml.get('value')} is not inside a camera. Ensure all tripwires are drawn inside a camera container.")
+        tripwires[id] = Tripwire.from_xml(tripwire_xml, cameras[parent_camera])
+        cameras[parent_camera].tripwires.append(tripwires[id])
         
+    planner = RoutePlanner(width, height, processes.values())
     for mover_xml in cat_cells["movers"]:
         source_id = mover_xml.get("source")
         target_id = mover_xml.get("target")
         id = mover_xml.get("id")
-        movers[id] = Mover.from_xml(mover_xml, movers_yaml, processes[source_id], processes[target_id])
+        fleets[id] = Fleet.from_xml(mover_xml, movers_yaml, processes[source_id], processes[target_id], planner)
+        for mover in fleets[id].movers:
+            movers[mover.gid] = mover 
 
-    state = State2D(processes=processes, movers=movers, rois=rois, cameras=cameras, items={}, height=height, width=width)
+    state = State2D(processes=processes, movers=movers, rois=rois, cameras=cameras, items={}, height=height, width=width, tripwires=tripwires, fleets=fleets)
     return state
             
 
@@ -134,9 +154,13 @@ def yaml_from_xml(xml_path, yaml_path):
         movers_written = set()
         for mover in cat_cells["movers"]:
             if mover.get("value") not in movers_written:
-                file.write(f"  {mover.get('value')}:\n    speed:\n    capacity:\n\n")
+                file.write(f"  {mover.get('value')}:\n    speed:\n    capacity:\n    count: 1\n\n")
                 movers_written.add(mover.get("value"))
 
+        file.write("cameras:\n")
+        for camera in cat_cells["cameras"]:
+            file.write(f"  {camera.get('value').split(':')[1]}:\n    fps: 1\n\n")
+
     return yaml_path
 
 def check_xml(xml):
@@ -151,7 +175,11 @@ def check_xml(xml):
     mxCells = dict()
     for item in root.findall("./diagram/mxGraphModel/root/"):
     
-        if "edge" in item.keys(): #arrow/mover
+        if "edge" in item.keys() and _is_tripwire(item): #line/tripwire 
+            if "source" in item.keys() or "target" in item.keys():
+                raise Exception(f"The tripwire {item.get('value')} is connected to a component. Tripwires must be lines that are not connected to any components.")
+
+        elif "edge" in item.keys(): #arrow/mover
             if item.get("value") == "":
                 raise Exception(f"An arrow in the diagram is not labelled. Ensure all arrows are labelled with the mover type.")
 
@@ -179,9 +207,9 @@ def check_yaml(yaml_path):
     with open(yaml_path, 'r') as f:
         yaml_data = yaml.full_load(f) #todo convert to all lower case 
 
-        #Verify processes, movers
-        if set(yaml_data.keys()) != set(["processes", "movers"]):
-            raise Exception(f"YAML file has {list(yaml_data.keys())} top level keys but requires ['processes', 'movers'] as top level keys")
+        #Verify processes, movers and optional cameras and noise 
+        if not set(["processes", "movers"]) <= set(yaml_data.keys()) <= set(["processes", "movers", "cameras", "noise"]):
+            raise Exception(f"YAML file has {list(yaml_data.keys())} top level keys but requires ['processes', 'movers'] as top level keys. 'cameras' and 'noise' are optional.")
         
         #Verify time, inputs, outputs for each process 
         for process_name, process_data in yaml_data["processes"].items():
@@ -200,13 +228,68 @@ def check_yaml(yaml_path):
                     raise Exception(f"The {process_name} process has an 'output' key but an output is not listed.")
                 if len(process_data["output"]) > 1:
                     raise Exception(f"The {process_name} process has too many items listed under the 'output' key. Only 1 item output is supported.")
+
+            #Verify inventory limits 
+            capacity = process_data.get("capacity", -1)
+            if isinstance(capacity, bool) or not isinstance(capacity, int): #yaml true/false are bools, which are ints in python 
+                raise Exception(f"The {process_name} process 'capacity' must be a whole number of items.")
+            if process_data.get("overflow", "block") not in ("block", "drop"):
+                raise Exception(f"The {process_name} process 'overflow' is {process_data['overflow']} but must be 'block' or 'drop'.")
+
+            #A full batch of inputs, and of outputs when full inventories block, has to fit or the process waits forever 
+            if capacity >= 0:
+                input_count = sum((process_data.get("input") or {}).values())
+                output_count = sum((process_data.get("output") or {}).values())
+                if capacity < input_count:
+                    raise Exception(f"The {process_name} process 'capacity' is {capacity} but its inputs need room for {input_count} items.")
+                if process_data.get("overflow", "block") == "block" and capacity < output_count:
+                    raise Exception(f"The {process_name} process 'capacity' is {capacity} but it makes {output_count} items at once. Use a capacity of at least {output_count} or 'overflow: drop'.")
+
+        #Warn about items that are never consumed or never produced. These pile up in inventories
+        inputs = set()
+        outputs = set()
+        for process_name, process_data in yaml_data["processes"].items():
+            inputs.update((process_data.get("input") or {}).keys())
+            outputs.update((process_data.get("output") or {}).keys())
+        for item in sorted(inputs - outputs):
+            print(f"Warning: '{item}' is a process input but no process outputs it. Processes that require it will never run.")
+        for item in sorted(outputs - inputs):
+            print(f"Warning: '{item}' is a process output but no process uses it as an input. These items will accumulate without limit unless the process has a 'capacity'.")
         
         #Verify movers
         for mover_name, mover_data in yaml_data["movers"].items():
             keys = set(mover_data.keys())
-            if keys != set(["speed", "capacity"]):
-                raise Exception(f"The {mover_name} mover keys are {list(keys)} but requires ['speed', 'capacity'].")
+            if not set(["speed", "capacity"]) <= keys <= set(["speed", "capacity", "count", "route", "jitter"]):
+                raise Exception(f"The {mover_name} mover keys are {list(keys)} but requires ['speed', 'capacity']. 'count', 'route' and 'jitter' are optional.")
+            count = mover_data.get("count", 1)
+            if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+                raise Exception(f"The {mover_name} mover 'count' is {count} but must be an integer of at least 1.")
+            if mover_data.get("route", "direct") not in ("direct", "grid"):
+                raise Exception(f"The {mover_name} mover 'route' is {mover_data['route']} but must be 'direct' or 'grid'.")
+            jitter = mover_data.get("jitter", 15)
+            if isinstance(jitter, bool) or not isinstance(jitter, (int, float)) or not 0 <= jitter <= 90:
+                raise Exception(f"The {mover_name} mover 'jitter' is {jitter} but must be a number of degrees from 0 to 90.")
             
+        #Verify cameras 
+        for camera_name, camera_data in (yaml_data.get("cameras") or {}).items():
+            fps = (camera_data or {}).get("fps", 1)
+            if not isinstance(fps, (int, float)) or fps <= 0:
+                raise Exception(f"The {camera_name} camera 'fps' is {fps} but must be a number greater than 0.")
+
+        #Verify noise 
+        for type, noise_data in (yaml_data.get("noise") or {}).items():
+            for key, value in (noise_data or {}).items():
+                if key in ("miss", "id_switch"):
+                    valid = isinstance(value, (int, float)) and 0 <= value <= 1
+                elif key in ("false_positive", "jitter"):
+                    valid = isinstance(value, (int, float)) and value >= 0
+                elif key == "confidence":
+                    valid = isinstance(value, list) and len(value) == 2 and all(isinstance(v, (int, float)) for v in value)
+                else:
+                    raise Exception(f"The {type} noise key '{key}' is unknown. Noise keys are ['miss', 'false_positive', 'jitter', 'confidence', 'id_switch'].")
+                if not valid:
+                    raise Exception(f"The {type} noise '{key}' is {value}. 'miss' and 'id_switch' are probabilities from 0 to 1, 'false_positive' and 'jitter' are numbers of at least 0 and 'confidence' is [mean, standard deviation].")
+
     print("Yaml file verified")
 
 if __name__ == "__main__":
@@ -30,6 +30,7 @@ class Visualizer2D_PyGame:
         
         self.cam_color = (255, 174, 0)
         self.roi_color = (0, 132, 255)
+        self.tripwire_color = (184, 84, 80)
         self.process_color = (44, 191, 75, 128)
         self.mover_color = (13, 45, 189)
         self.item_color = (237, 5, 16, 128)
@@ -55,6 +56,9 @@ class Visualizer2D_PyGame:
         for _, obj in state.rois.items():
             pygame.draw.rect(self.screen, self.roi_color, (obj.x,obj.y,obj.width,obj.height), width=4)
 
+        for _, obj in state.tripwires.items():
+            pygame.draw.line(self.screen, self.tripwire_color, (obj.x1, obj.y1), (obj.x2, obj.y2), width=4)
+
         for obj in state.items:
             surface = pygame.Surface((obj.width, obj.height), pygame.SRCALPHA)
             surface.fill(self.item_color)
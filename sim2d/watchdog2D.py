@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from collections import deque 
+
+class MemoryWatchdog:
+    """Simulator observer that reports item growth rates and warns about items that accumulate without limit
+
+    Every interval timesteps the number of items held by each process inventory and by the whole simulation is sampled. 
+    Mover inventories are bounded by the mover capacity and are not sampled. 
+    The growth rate is the least squares slope over the last `windows` samples. A process is reported when its 
+    inventory never decreased during the window, grew overall and holds more items than one batch of its inputs and outputs. 
+    """
+
+    def __init__(self, interval=60, windows=10, min_rate=0.0):
+        self.interval = interval #timesteps between samples 
+        self.windows = windows #number of samples used to compute growth 
+        self.min_rate = min_rate #items per minute required before warning 
+        self.samples = {} #"all items" or "process:<id>" -> deque of item counts 
+        self.warned = set()
+
+    def _sample(self, state):
+        counts = {"all items": len(state.items)}
+        for process in state.processes.values():
+            counts[f"process:{process.gid}"] = process.inventory.size #processes with the same name are sampled separately 
+        return counts 
+
+    def rates(self):
+        """Growth rate in items per minute of every sampled inventory"""
+        rates = {}
+        for name, samples in self.samples.items():
+            n = len(samples)
+            if n < 2:
+                continue 
+            mean_x = (n - 1) / 2
+            mean_y = sum(samples) / n 
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(samples)) / sum((x - mean_x) ** 2 for x in range(n))
+            rates[name] = slope * 60 / self.interval 
+        return rates 
+
+    def growing(self):
+        """Names of inventories that never decreased during the window and grew overall"""
+        growing = []
+        for name, samples in self.samples.items():
+            if len(samples) == self.windows and samples[-1] > samples[0] and all(b >= a for a, b in zip(samples, list(samples)[1:])):
+                growing.append(name)
+        return growing 
+
+    def __call__(self, state, tick):
+        if tick % self.interval != 0:
+            return 
+
+        for name, count in self._sample(state).items():
+            self.samples.setdefault(name, deque(maxlen=self.windows)).append(count)
+
+        rates = self.rates()
+        growing = set(self.growing())
+        for process in state.processes.values():
+            name = f"process:{process.gid}"
+            batch = sum(process.required_inputs.values()) + sum(process.required_outputs.values())
+            if name not in growing or name in self.warned or rates[name] <= self.min_rate or process.inventory.size <= batch:
+                continue 
+            self.warned.add(name)
+
+            message = f"Warning: process {process.type} ({process.gid}) has grown for {self.windows * self.interval} seconds at {rates[name]:.1f} items per minute and holds {process.inventory.size} items."
+
+            #Item types the process holds but never consumes 
+            known = set(process.required_inputs) | set(process.required_outputs)
+            unused = sorted(t for t, items in process.inventory.items.items() if items and t not in known)
+            if unused:
+                message += f" It never consumes {unused}. Check the process inputs in the yaml or set a 'capacity'."
+            print(message)
@@ -0,0 +1,347 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Compact binary encoding of ELK records for local consumers. 
+
+Layout version 1, little endian. A stream starts with b"SIM2DWIR" and the version (u16). Then every record is 
+a u32 length followed by that many bytes starting with a u8 kind: 
+
+    0 JSON     utf-8 ELK JSON line. Used for every record that does not fit kinds 2 and 3 
+    1 STRING   u32 string id, utf-8 string. Defines a string used by later records 
+    2 RAW      envelope, u32 n, OBJECT[n], u32 id bytes, object ids joined by "\n" 
+    3 FRAMES   envelope, u32 place, u32 n, (u32 type, u32 count)[n], u32 r, ROI[r] 
+
+    envelope   u32 index, 16 byte record id (uuid), i64 timestamp in ms since the epoch, u32 sensorId, u16 length + frame id 
+    OBJECT     leftX, bottomY, topY, rightX, confidence, dir x, dir y, speed (f64), type (u32). See OBJECT below 
+    ROI        u32 id, u32 type, u32 count, u32 n, (x, y, z)[n] f64, u32 id bytes, object ids joined by "\n" 
+
+u32 index, sensorId, place and type fields are string ids. Fields of the MDX schema that the simulator always 
+leaves at their defaults are not stored; records that use them are written as JSON so the encoding is lossless. 
+
+Convert back to an ELK dump: 
+python3 -m sim2d.wire2D mdx_elk.bin mdx_elk.json
+"""
+
+import datetime 
+import json 
+import struct 
+import uuid 
+import numpy as np 
+
+MAGIC = b"SIM2DWIR"
+VERSION = 1
+JSON, STRING, RAW, FRAMES = 0, 1, 2, 3
+
+OBJECT = np.dtype([("bbox", "<f8", 4), ("confidence", "<f8"), ("dir", "<f8", 2), ("speed", "<f8"), ("type", "<u4")])
+ENVELOPE = struct.Struct("<I16sqI")
+EPOCH = datetime.datetime(1970, 1, 1)
+
+#Values of the fields that are not stored 
+OBJECT_DEFAULTS = {"embedding": None, "pose": None, "lipActivity": None, "info": {}, "coordinate": None, "gaze": None, "location": None}
+
+
+def _timestamp_ms(timestamp):
+    """Milliseconds since the epoch of an mdx timestamp or None if it would not format back to the same string"""
+    try:
+        ms = round((datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ") - EPOCH).total_seconds() * 1000)
+    except ValueError:
+        return None 
+    return ms if _format_timestamp(ms) == timestamp else None 
+
+def _format_timestamp(ms):
+    return (EPOCH + datetime.timedelta(milliseconds=ms)).isoformat("T", timespec="milliseconds") + "Z"
+
+def _record_id(record_id):
+    """16 bytes of a canonical uuid string or None"""
+    try:
+        value = uuid.UUID(record_id)
+    except ValueError:
+        return None 
+    return value.bytes if str(value) == record_id else None 
+
+def _join(ids):
+    """Ids joined by newlines or None if an id can't be joined losslessly"""
+    if not all(isinstance(gid, str) and "\n" not in gid for gid in ids):
+        return None 
+    data = "\n".join(ids).encode()
+    return struct.pack("<I", len(data)) + data 
+
+def _split(data, pos):
+    length = struct.unpack_from("<I", data, pos)[0]
+    pos += 4
+    ids = data[pos:pos + length].decode().split("\n") if length else []
+    return ids, pos + length 
+
+
+class WireEncoder:
+    """Encodes ELK records (dicts as in the JSON dump) to the binary format"""
+
+    def __init__(self):
+        self.strings = {} #string -> id 
+
+    def header(self):
+        return MAGIC + struct.pack("<H", VERSION)
+
+    def _frame(self, kind, payload):
+        return struct.pack("<IB", len(payload) + 1, kind) + payload 
+
+    def _string(self, s, out):
+        """Id of a string. Defines the string in out the first time it is used"""
+        if s not in self.strings:
+            self.strings[s] = len(self.strings)
+            out.append(self._frame(STRING, struct.pack("<I", self.strings[s]) + s.encode()))
+        return self.strings[s]
+
+    def encode(self, record, line=None):
+        """Bytes of one record. line is the JSON of the record, or a function that returns it, used if the record is written as JSON"""
+        out = []
+        payload = None 
+        source = record.get("_source", {})
+        kind = source.get("type")
+        if kind in ("mdx-raw", "mdx-frames") and record.get("_type") == "logs" and record.get("_score") == 1 and source.get("version") == "4.0":
+            payload = self._raw(record, out) if kind == "mdx-raw" else self._frames(record, out)
+
+        if payload is None:
+            line = line() if callable(line) else line 
+            line = line if line is not None else json.dumps(record, separators=(",", ":"), ensure_ascii=False)
+            return b"".join(out) + self._frame(JSON, line.encode())
+        return b"".join(out) + self._frame(RAW if kind == "mdx-raw" else FRAMES, payload)
+
+    def _envelope(self, record, keys, out):
+        source = record["_source"]
+        if list(record) != ["_index", "_type", "_id", "_score", "_source"] or list(source) != keys:
+            return None 
+        record_id = _record_id(record["_id"])
+        timestamp = _timestamp_ms(source["timestamp"])
+        if record_id is None or timestamp is None or not isinstance(source["id"], str):
+            return None 
+        frame_id = source["id"].encode()
+        return ENVELOPE.pack(self._string(record["_index"], out), record_id, timestamp, self._string(source["sensorId"], out)) + struct.pack("<H", len(frame_id)) + frame_id 
+
+    def _raw(self, record, out):
+        envelope = self._envelope(record, ["timestamp", "id", "sensorId", "objects", "type", "version"], out)
+        objects = record["_source"]["objects"]
+        if envelope is None:
+            return None 
+
+        keys = ["bbox", "id", "type", "confidence", "dir", "embedding", "pose", "lipActivity", "speed", "info", "coordinate", "gaze", "location"]
+        array = np.zeros(len(objects), dtype=OBJECT)
+        for i, obj in enumerate(objects):
+            bbox = obj["bbox"]
+            if list(obj) != keys or list(bbox) != ["leftX", "bottomY", "topY", "rightX"] or len(obj["dir"]) != 2:
+                return None 
+            if any(obj[key] != value for key, value in OBJECT_DEFAULTS.items()):
+                return None 
+            values = [bbox["leftX"], bbox["bottomY"], bbox["topY"], bbox["rightX"], obj["confidence"], *obj["dir"], obj["speed"]]
+            if not all(type(v) is float for v in values):
+                return None 
+            array[i] = (values[0:4], values[4], values[5:7], values[7], self._string(obj["type"], out))
+
+        ids = _join([obj["id"] for obj in objects])
+        if ids is None:
+            return None 
+        return envelope + struct.pack("<I", len(objects)) + array.tobytes() + ids 
+
+    def _frames(self, record, out):
+        source = record["_source"]
+        envelope = self._envelope(record, ["timestamp", "fov", "rois", "version", "sensorId", "objects", "id", "info", "type"], out)
+        if envelope is None or source["objects"] != [] or list(source["info"]) != ["place"] or not isinstance(source["info"]["place"], str):
+            return None 
+
+        parts = [envelope, struct.pack("<II", self._string(source["info"]["place"], out), len(source["fov"]))]
+        for fov in source["fov"]:
+            if fov["id"] != "" or fov["coordinates"] != [] or fov["ids"] != [] or list(fov) != ["id", "coordinates", "count", "ids", "type"] or type(fov["count"]) is not int:
+                return None 
+            parts.append(struct.pack("<II", self._string(fov["type"], out), fov["count"]))
+
+        parts.append(struct.pack("<I", len(source["rois"])))
+        for roi in source["rois"]:
+            if list(roi) != ["id", "coordinates", "count", "ids", "type"] or type(roi["count"]) is not int:
+                return None 
+            coords = [(c["x"], c["y"], c["z"]) for c in roi["coordinates"]]
+            if any(list(c) != ["x", "y", "z"] for c in roi["coordinates"]) or not all(type(v) is float for c in coords for v in c):
+                return None 
+            ids = _join(roi["ids"])
+            if ids is None:
+                return None 
+            parts.append(struct.pack("<IIII", self._string(roi["id"], out), self._string(roi["type"], out), roi["count"], len(coords)))
+            parts.append(np.array(coords, dtype="<f8").tobytes())
+            parts.append(ids)
+        return b"".join(parts)
+
+
+class WireDecoder:
+    """Decodes a binary stream. records() yields ELK records as dicts; frames() yields arrays for fast consumers"""
+
+    def __init__(self, file):
+        self.file = file 
+        if file.read(len(MAGIC)) != MAGIC:
+            raise Exception("The file is not a sim2d binary stream.")
+        version = struct.unpack("<H", file.read(2))[0]
+        if version != VERSION:
+            raise Exception(f"The binary stream has version {version} but this decoder supports version {VERSION}.")
+        self.strings = []
+
+    def _payloads(self):
+        """Yield (kind, payload) of every record. String definitions are handled here"""
+        while True:
+            prefix = self.file.read(4)
+            if len(prefix) < 4:
+                return 
+            data = self.file.read(struct.unpack("<I", prefix)[0])
+            kind = data[0]
+            if kind == STRING:
+                string_id = struct.unpack_from("<I", data, 1)[0]
+                if string_id != len(self.strings):
+                    raise Exception(f"String {string_id} is defined out of order.")
+                self.strings.append(data[5:].decode())
+                continue 
+            yield kind, data 
+
+    def _envelope(self, data):
+        index, record_id, timestamp, sensor = ENVELOPE.unpack_from(data, 1)
+        pos = 1 + ENVELOPE.size 
+        length = struct.unpack_from("<H", data, pos)[0]
+        frame_id = data[pos + 2:pos + 2 + length].decode()
+        return {"index": self.strings[index], "id": str(uuid.UUID(bytes=record_id)), "timestamp": timestamp, "sensorId": self.strings[sensor], "frameId": frame_id}, pos + 2 + length 
+
+    def frames(self):
+        """Yield (kind, fields) with the fields of RAW and FRAMES records as arrays and lists. JSON records are yielded as dicts"""
+        for kind, data in self._payloads():
+            yield kind, self._fields(kind, data)
+
+    def _fields(self, kind, data):
+        if kind == JSON:
+            return json.loads(data[1:])
+
+        fields, pos = self._envelope(data)
+        if kind == RAW:
+            n = struct.unpack_from("<I", data, pos)[0]
+            objects = np.frombuffer(data, dtype=OBJECT, count=n, offset=pos + 4)
+            ids, pos = _split(data, pos + 4 + OBJECT.itemsize * n)
+            fields.update(objects=objects, ids=ids)
+
+        elif kind == FRAMES:
+            place, n = struct.unpack_from("<II", data, pos)
+            pos += 8
+            fov = [(self.strings[t], c) for t, c in struct.iter_unpack("<II", data[pos:pos + 8 * n])]
+            pos += 8 * n 
+            rois = []
+            r = struct.unpack_from("<I", data, pos)[0]
+            pos += 4
+            for _ in range(r):
+                roi_id, roi_type, count, m = struct.unpack_from("<IIII", data, pos)
+                coords = np.frombuffer(data, dtype="<f8", count=3 * m, offset=pos + 16).reshape(m, 3)
+                ids, pos = _split(data, pos + 16 + 24 * m)
+                rois.append((self.strings[roi_id], self.strings[roi_type], count, coords, ids))
+            fields.update(place=self.strings[place], fov=fov, rois=rois)
+        return fields 
+
+    def records(self):
+        """Yield every record as an ELK record dict, the same as the JSON dump"""
+        for kind, fields in self.frames():
+            if kind == JSON:
+                yield fields 
+            elif kind == RAW:
+                yield self._raw_record(fields)
+            elif kind == FRAMES:
+                yield self._frames_record(fields)
+
+    def _record(self, fields, source):
+        return {"_index": fields["index"], "_type": "logs", "_id": fields["id"], "_score": 1, "_source": source}
+
+    def _raw_record(self, fields):
+        objects = []
+        for obj, gid in zip(fields["objects"].tolist(), fields["ids"]):
+            (left, bottom, top, right), confidence, direction, speed, type = obj 
+            objects.append({"bbox": {"leftX": left, "bottomY": bottom, "topY": top, "rightX": right}, "id": gid, "type": self.strings[type], 
+                            "confidence": confidence, "dir": list(direction), "embedding": None, "pose": None, "lipActivity": None, "speed": speed, 
+                            "info": {}, "coordinate": None, "gaze": None, "location": None})
+        source = {"timestamp": _format_timestamp(fields["timestamp"]), "id": fields["frameId"], "sensorId": fields["sensorId"], "objects": objects, "type": "mdx-raw", "version": "4.0"}
+        return self._record(fields, source)
+
+    def _frames_record(self, fields):
+        fov = [{"id": "", "coordinates": [], "count": count, "ids": [], "type": type} for type, count in fields["fov"]]
+        rois = []
+        for roi_id, roi_type, count, coords, ids in fields["rois"]:
+            coordinates = [{"x": x, "y": y, "z": z} for x, y, z in coords.tolist()]
+            rois.append({"id": roi_id, "coordinates": coordinates, "count": count, "ids": ids, "type": roi_type})
+        source = {"timestamp": _format_timestamp(fields["timestamp"]), "fov": fov, "rois": rois, "version": "4.0", "sensorId": fields["sensorId"], 
+                  "objects": [], "id": fields["frameId"], "info": {"place": fields["place"]}, "type": "mdx-frames"}
+        return self._record(fields, source)
+
+
+class BinarySink:
+    """Writes ELK index records in the binary format instead of JSON lines"""
+
+    def __init__(self, path):
+        self.path = path 
+        self.file = open(path, "wb+")
+        self.encoder = WireEncoder()
+        self.file.write(self.encoder.header())
+
+    def write(self, record):
+        self.file.write(self.encoder.encode(record.model_dump(by_alias=True), lambda: record.model_dump_json(by_alias=True)))
+
+    def write_line(self, line):
+        """Write a record that is already encoded as an ELK JSON line"""
+        self.file.write(self.encoder.encode(json.loads(line), line))
+
+    def close(self):
+        self.file.close()
+
+
+def to_elk_json(binary_path, json_path):
+    """Convert a binary stream back to an ELK dump with one JSON record per line. 
+    
+    Records are serialized with the MDX schema models like Analytics2D does, so the dump is identical to the 
+    JSON the simulator would have written. 
+    """
+    from .mdx_schema import elk_index_pyd, mdx_raw_pyd, mdx_frames_pyd
+
+    count = 0
+    with open(binary_path, "rb") as f, open(json_path, "w+") as out:
+        decoder = WireDecoder(f)
+        for kind, data in decoder._payloads():
+            if kind == JSON: #written as the original line 
+                line = data[1:].decode()
+            else:
+                fields = decoder._fields(kind, data)
+                record = decoder._raw_record(fields) if kind == RAW else decoder._frames_record(fields)
+                source = record["_source"]
+                if kind == RAW: #fields left at their defaults are not set, like in Analytics2D 
+                    source["objects"] = [{k: v for k, v in obj.items() if k not in OBJECT_DEFAULTS} for obj in source["objects"]]
+                model = mdx_raw_pyd if kind == RAW else mdx_frames_pyd 
+                line = elk_index_pyd(index=record["_index"], id=record["_id"], source=model.model_validate(source)).model_dump_json(by_alias=True)
+            out.write(line)
+            out.write("\n")
+            count += 1
+    return count 
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert a sim2d binary stream to an ELK dump")
+    parser.add_argument("binary_path", help="Path of the binary stream")
+    parser.add_argument("json_path", help="Path of the ELK dump to write")
+    args = parser.parse_args()
+    print(f"Wrote {to_elk_json(args.binary_path, args.json_path)} records to {args.json_path}")
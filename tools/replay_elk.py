@@ -0,0 +1,148 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import calendar 
+import json 
+import mmap 
+import os 
+import time 
+from collections import defaultdict 
+
+
+def parse_time(timestamp):
+    """Epoch seconds of an mdx timestamp (2023-12-12T10:00:00.000Z) or of a time given on the command line (2023-12-12T10:00:00)"""
+    seconds = calendar.timegm(time.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S"))
+    fraction = timestamp[19:].rstrip("Z")
+    return seconds + (float(fraction) if fraction else 0.0)
+
+
+def load_index(index_path):
+    """Read a sidecar index written by the simulator. Returns {(bucket, sensorId, index): [offsets]} and the bucket size. 
+    The bucket size is None for sidecars written without a header"""
+    entries = defaultdict(list)
+    bucket_size = None 
+    with open(index_path, "r") as f:
+        for line in f:
+            entry = json.loads(line)
+            if isinstance(entry, dict): #header 
+                bucket_size = entry["bucket"]
+                continue 
+            bucket, sensor_id, index, offsets = entry 
+            entries[(bucket, sensor_id, index)].extend(offsets)
+    return entries, bucket_size 
+
+
+class ElkReplay:
+    """Random access to an ELK dump through its sidecar index. The dump is memory mapped and only 
+    the records of the requested buckets are read"""
+
+    def __init__(self, filepath, index_path=None):
+        self.file = open(filepath, "rb")
+        #An empty file can not be memory mapped. It has no index entries so no line is ever read 
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(filepath) else None 
+        self.entries, self.bucket_size = load_index(index_path or f"{filepath}.idx")
+
+    def offsets(self, start=None, end=None, sensors=None, indices=None):
+        """Sorted byte offsets of the records in the buckets that overlap [start, end). Without a known bucket size 
+        every bucket before start is read"""
+        offsets = []
+        for (bucket, sensor_id, index), key_offsets in self.entries.items():
+            if start is not None and self.bucket_size is not None and bucket + self.bucket_size <= start:
+                continue 
+            if end is not None and bucket >= end:
+                continue 
+            if sensors and sensor_id not in sensors:
+                continue 
+            if indices and not any(index.startswith(i) for i in indices):
+                continue 
+            offsets.extend(key_offsets)
+        return sorted(offsets)
+
+    def line(self, offset):
+        end = self.mm.find(b"\n", offset)
+        return self.mm[offset:end if end >= 0 else len(self.mm)]
+
+    def records(self, start=None, end=None, sensors=None, indices=None):
+        """Yield the records with a timestamp in [start, end) in file order. start and end are epoch seconds"""
+        for offset in self.offsets(start, end, sensors, indices):
+            record = json.loads(self.line(offset))
+            timestamp = parse_time(record["_source"]["timestamp"])
+            if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                yield record 
+
+    def detections(self, start=None, end=None, sensors=None):
+        """Yield (timestamp, {sensorId: objects}) for every frame of the mdx-raw records in [start, end)"""
+        frame_timestamp = None 
+        frame = {}
+        for record in self.records(start, end, sensors, ["mdx-raw"]):
+            source = record["_source"]
+            if source["timestamp"] != frame_timestamp:
+                if frame:
+                    yield frame_timestamp, frame 
+                frame_timestamp, frame = source["timestamp"], {}
+            frame[source["sensorId"]] = source["objects"]
+        if frame:
+            yield frame_timestamp, frame 
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    """
+    Example Usage:
+    python3 replay_elk.py -f mdx_elk.json -s 2023-12-12T10:00:00 -e 2023-12-12T11:00:00 -sid shipping -i mdx-raw -o shipping.json
+    python3 replay_elk.py -f mdx_elk.json -s 2023-12-12T10:00:00 -e 2023-12-12T10:05:00 --state
+    """
+    parser = argparse.ArgumentParser(prog="MDX Replay", description="Reads a time window of an ELK dump written by the simulator using its .idx sidecar index.")
+    parser.add_argument("-f", "--filepath", help="Filepath to the ELK dump. The index must be next to it as <filepath>.idx", required=True)
+    parser.add_argument("-s", "--start", default=None, help="Start of the time window in UTC, e.g. 2023-12-12T10:00:00")
+    parser.add_argument("-e", "--end", default=None, help="End of the time window in UTC (exclusive)")
+    parser.add_argument("-sid", "--sensors", nargs='+', default=None, help="Only replay records of these sensorIds")
+    parser.add_argument("-i", "--indices", nargs='+', default=None, help="Only replay these indices, e.g. mdx-raw mdx-frames")
+    parser.add_argument("-o", "--output", default=None, help="Write the records to this file instead of stdout")
+    parser.add_argument("--state", action="store_true", help="Print the number of detected objects of every sensor for each frame instead of the records")
+
+    args = parser.parse_args()
+    start = parse_time(args.start) if args.start else None 
+    end = parse_time(args.end) if args.end else None 
+
+    replay = ElkReplay(args.filepath)
+    if args.state:
+        for timestamp, frame in replay.detections(start, end, args.sensors):
+            print(timestamp, {sensor_id: len(objects) for sensor_id, objects in frame.items()})
+    else:
+        output = open(args.output, "w+") if args.output else None 
+        count = 0
+        for record in replay.records(start, end, args.sensors, args.indices):
+            line = json.dumps(record)
+            if output:
+                output.write(line + "\n")
+            else:
+                print(line)
+            count += 1
+        if output:
+            output.close()
+            print(f"Wrote {count} records to {args.output}")
+    replay.close()
@@ -0,0 +1,178 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import json 
+import math 
+import os 
+import re 
+import sys 
+from multiprocessing import Pool 
+from pathlib import Path 
+from tqdm import tqdm 
+
+sys.path.insert(0, str(Path(__file__).resolve().parent)) #replay_elk is next to this file, wherever it is run from 
+from replay_elk import parse_time 
+
+INDEX = re.compile(rb'"_index"\s*:\s*"([^"]*)"')
+TIMESTAMP = re.compile(rb'"timestamp"\s*:\s*"([^"]*)"')
+SENSOR = re.compile(rb'"sensorId"\s*:\s*"([^"]*)"')
+SAMPLED = ("mdx-raw", "mdx-frames") #indices with one record per frame. Other indices hold events and are never downsampled 
+
+
+def prefix_filename(path, prefix):
+    path = Path(path)
+    return str(path.with_name(f"{prefix}_{path.name}"))
+
+
+class FrameAggregate:
+    """Combines the records of one sensor and index in a time bucket into one record"""
+
+    def __init__(self, record):
+        self.record = record #the first record of the bucket keeps its id and timestamp 
+        self.frames = 0
+        self.fov = {} #type -> summed count 
+        self.rois = {} #(roi id, type) -> {object id: coordinates} 
+        self.objects = {} #object id -> last observation 
+
+    def add(self, source):
+        self.frames += 1
+        for fov in source.get("fov", []):
+            self.fov[fov["type"]] = self.fov.get(fov["type"], 0) + fov["count"]
+        for roi in source.get("rois", []):
+            seen = self.rois.setdefault((roi["id"], roi["type"]), {})
+            for gid, coordinates in zip(roi["ids"], roi["coordinates"]):
+                seen[gid] = coordinates 
+        for obj in source.get("objects", []):
+            self.objects[obj["id"]] = obj 
+
+    def line(self):
+        """The bucket as one ELK line. Frames get the mean fov counts and every object seen in each ROI, raw 
+        records the last detection of every object"""
+        source = self.record["_source"]
+        if self.record["_index"].startswith("mdx-frames"):
+            source["fov"] = [{"id": "", "coordinates": [], "count": round(count / self.frames), "ids": [], "type": type} for type, count in self.fov.items()]
+            source["rois"] = [{"id": roi_id, "coordinates": list(seen.values()), "count": len(seen), "ids": list(seen), "type": type} for (roi_id, type), seen in self.rois.items()]
+            source.setdefault("info", {})["frames"] = self.frames 
+        else:
+            source["objects"] = list(self.objects.values())
+        return json.dumps(self.record, separators=(",", ":")).encode() + b"\n"
+
+
+def resample(filepath, output_path, sensors=None, indices=None, start=None, end=None, rate=None, aggregate=False):
+    """Stream one dump and write the records that pass the filters. With a rate, raw and frames records are 
+    reduced to one per sensor every `rate` seconds, either the first record or the aggregate of the bucket. 
+    Memory only grows with the number of sensors. Returns the number of lines read and written"""
+    sensors = set(s.encode() for s in sensors) if sensors else None 
+    indices = tuple(i.encode() for i in indices) if indices else None 
+    buckets = {} #(index, sensorId) -> bucket of the last record kept 
+    aggregates = {} #(index, sensorId) -> FrameAggregate of the current bucket 
+    second = epoch_second = None #last parsed timestamp up to the second. Records are in time order so most lines reuse it 
+    read = written = 0
+
+    with open(filepath, "rb") as f, open(output_path, "wb") as out:
+        for line in f:
+            if not line.strip():
+                continue 
+            read += 1
+            index = INDEX.search(line)
+            index = index.group(1) if index else b""
+            if indices and not index.startswith(indices):
+                continue 
+            sensor = SENSOR.search(line)
+            sensor = sensor.group(1) if sensor else None 
+            if sensors and sensor not in sensors:
+                continue 
+
+            timestamp = TIMESTAMP.search(line)
+            epoch = None 
+            if timestamp and (start is not None or end is not None or rate):
+                timestamp = timestamp.group(1).decode()
+                if timestamp[:19] != second:
+                    second, epoch_second = timestamp[:19], parse_time(timestamp[:19])
+                epoch = epoch_second + (float(timestamp[19:].rstrip("Z") or 0))
+                if (start is not None and epoch < start) or (end is not None and epoch >= end):
+                    continue 
+
+            kind = index.rsplit(b"-", 3)[0] #mdx-raw-2023-12-12 -> mdx-raw 
+            if not rate or epoch is None or kind.decode() not in SAMPLED:
+                out.write(line if line.endswith(b"\n") else line + b"\n")
+                written += 1
+                continue 
+
+            key = (index, sensor)
+            bucket = math.floor(epoch / rate)
+            if aggregate:
+                current = aggregates.get(key)
+                if current is None or buckets[key] != bucket:
+                    if current is not None:
+                        out.write(current.line())
+                        written += 1
+                    record = json.loads(line)
+                    current = aggregates[key] = FrameAggregate(record)
+                    buckets[key] = bucket 
+                    current.add(record["_source"])
+                else:
+                    current.add(json.loads(line)["_source"])
+            elif buckets.get(key) != bucket: #the first record of every bucket is kept unchanged 
+                buckets[key] = bucket 
+                out.write(line if line.endswith(b"\n") else line + b"\n")
+                written += 1
+
+        for current in aggregates.values():
+            out.write(current.line())
+            written += 1
+    return read, written 
+
+def _resample(task):
+    filepath, output_path, options = task 
+    return filepath, output_path, resample(filepath, output_path, **options)
+
+
+if __name__ == "__main__":
+    """
+    Example Usage:
+    python3 resample_elk.py -f mdx_elk.json -r 5
+    python3 resample_elk.py -f mdx-frames-2023-12-12.json mdx-raw-2023-12-12.json -r 10 --aggregate -sid shipping
+    python3 resample_elk.py -f mdx_elk.json -s 2023-12-12T10:00:00 -e 2023-12-12T11:00:00 -i mdx-raw mdx-tripwire
+    """
+    parser = argparse.ArgumentParser(prog="MDX Resampler", description="Filters and downsamples MDX ELK dumps in one pass.")
+    parser.add_argument("-f", "--filepaths", nargs='+', help="Filepaths to ELK dump with MDX data. Accepts multiple files.", required=True)
+    parser.add_argument("-sid", "--sensors", nargs='+', default=None, help="Only keep records of these sensorIds")
+    parser.add_argument("-i", "--indices", nargs='+', default=None, help="Only keep records of indices starting with these names (e.g. mdx-raw mdx-frames)")
+    parser.add_argument("-s", "--start", default=None, help="Only keep records at or after this UTC time (e.g. 2023-12-12T10:00:00)")
+    parser.add_argument("-e", "--end", default=None, help="Only keep records before this UTC time")
+    parser.add_argument("-r", "--rate", type=float, default=None, help="Keep one mdx-raw and mdx-frames record per sensor every this many seconds")
+    parser.add_argument("--aggregate", action="store_true", help="With -r, combine the records of every interval instead of keeping the first one")
+    parser.add_argument("-op", "--output_prefix", default="resampled", help="Add an output_prefix to append to filenames for the output.")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="Number of files processed in parallel")
+
+    args = parser.parse_args()
+    print(args)
+    if args.aggregate and not args.rate:
+        raise Exception("--aggregate requires a rate with -r.")
+
+    options = {"sensors": args.sensors, "indices": args.indices, "rate": args.rate, "aggregate": args.aggregate, 
+               "start": parse_time(args.start) if args.start else None, "end": parse_time(args.end) if args.end else None}
+    tasks = [(file, prefix_filename(file, args.output_prefix), options) for file in args.filepaths]
+    with Pool(min(args.workers, len(tasks))) as pool:
+        for file, output_path, (read, written) in tqdm(pool.imap_unordered(_resample, tasks), total=len(tasks)):
+            print(f"Wrote {written} of {read} records of {file} to {output_path}")
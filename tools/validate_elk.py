@@ -0,0 +1,241 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import json 
+import mmap 
+import os 
+import sys 
+from collections import Counter, defaultdict 
+from multiprocessing import Pool 
+from pathlib import Path 
+from tqdm import tqdm 
+from pydantic import ValidationError 
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) #the schema models live in sim2d 
+sys.path.insert(0, str(Path(__file__).resolve().parent)) #replay_elk is next to this file, wherever it is run from 
+from sim2d.mdx_schema import mdx_raw_pyd, mdx_frames_pyd, tripwire_pyd, behavior_pyd, rollup_pyd
+from replay_elk import parse_time 
+
+MODELS = {"mdx-raw": mdx_raw_pyd, "mdx-frames": mdx_frames_pyd, "mdx-tripwire": tripwire_pyd, 
+          "mdx-behavior": behavior_pyd, "mdx-rollup": rollup_pyd} #index prefix -> model of _source 
+ENVELOPE = ("_index", "_type", "_id", "_score", "_source")
+
+
+def chunk_bounds(filepath, chunk_size):
+    """Split a file into (start, end) byte ranges of about chunk_size that start and end on line boundaries"""
+    size = os.path.getsize(filepath)
+    if size == 0:
+        return []
+    with open(filepath, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = []
+        start = 0
+        while start < size:
+            end = mm.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if end < 0 else end + 1
+            bounds.append((start, end))
+            start = end 
+    return bounds 
+
+def model_for(index):
+    for prefix, model in MODELS.items():
+        if index.startswith(prefix):
+            return prefix, model 
+    return None, None 
+
+def _types(kind, source):
+    """Object types of a record with the number of objects of each type"""
+    if kind in ("mdx-raw", "mdx-rollup"):
+        return Counter(obj["type"] for obj in source["objects"])
+    if kind == "mdx-frames":
+        counts = Counter()
+        for fov in source["fov"]:
+            counts[fov["type"]] += fov["count"]
+        return counts 
+    if kind == "mdx-tripwire":
+        return Counter([source["object"]["type"]])
+    return Counter([source["objectType"]])
+
+def new_coverage(second, offset):
+    return {"start": second, "end": second, "seconds": 1, "gaps": [], "offset": offset}
+
+def validate_chunk(task):
+    """Validate the lines of one byte range. Returns the counts, timestamp coverage and errors of the chunk. 
+    Coverage is checked as the records stream past, so memory does not grow with the size of the chunk"""
+    filepath, start, end, max_errors, gap = task 
+    result = {"lines": 0, "errors": 0, "error_samples": [], "indices": Counter(), "types": defaultdict(Counter), 
+              "coverage": {}, "bytes": end - start}
+    last = epoch = None #last parsed timestamp up to the second. Records are in time order so most lines reuse it 
+
+    def error(offset, message):
+        result["errors"] += 1
+        if len(result["error_samples"]) < max_errors:
+            result["error_samples"].append((offset, message))
+
+    with open(filepath, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = start 
+        while offset < end:
+            line_end = mm.find(b"\n", offset, end)
+            line_end = end if line_end < 0 else line_end 
+            line = mm[offset:line_end]
+            line_offset, offset = offset, line_end + 1
+            if not line.strip():
+                continue 
+            result["lines"] += 1
+
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                error(line_offset, f"invalid JSON: {e}")
+                continue 
+            if not isinstance(record, dict) or any(key not in record for key in ENVELOPE):
+                error(line_offset, f"missing ELK fields, expected {', '.join(ENVELOPE)}")
+                continue 
+            kind, model = model_for(record["_index"])
+            if model is None:
+                error(line_offset, f"unknown index {record['_index']}")
+                continue 
+            try:
+                model.model_validate(record["_source"])
+            except ValidationError as e:
+                first = e.errors()[0]
+                location = ".".join(str(part) for part in first["loc"])
+                error(line_offset, f"{record['_index']}: {e.error_count()} errors, {location}: {first['msg']}")
+                continue 
+
+            source = record["_source"]
+            result["indices"][record["_index"]] += 1
+            result["types"][kind].update(_types(kind, source))
+            if kind in ("mdx-raw", "mdx-frames"):
+                second = source["timestamp"][:19]
+                if second != last:
+                    last, epoch = second, int(parse_time(second))
+                coverage = result["coverage"].get(source["sensorId"])
+                if coverage is None:
+                    result["coverage"][source["sensorId"]] = new_coverage(epoch, line_offset)
+                elif epoch < coverage["end"]: #continue from this record so one misplaced record is only reported where it breaks the order 
+                    error(line_offset, f"{source['sensorId']} record at {source['timestamp']} is earlier than the previous record of the sensor")
+                    coverage["end"] = epoch 
+                elif epoch > coverage["end"]:
+                    if epoch - coverage["end"] > gap:
+                        coverage["gaps"].append((coverage["end"], epoch))
+                    coverage["end"] = epoch 
+                    coverage["seconds"] += 1
+    return result 
+
+
+def follow(coverage, after, gap):
+    """Extend the coverage of a sensor with the coverage of the next chunk. Returns False if the chunk starts 
+    before the end of the coverage"""
+    ordered = after["start"] >= coverage["end"]
+    if after["start"] - coverage["end"] > gap:
+        coverage["gaps"].append((coverage["end"], after["start"]))
+    coverage["gaps"].extend(after["gaps"])
+    coverage["seconds"] += after["seconds"] - (after["start"] == coverage["end"])
+    coverage["end"] = after["end"]
+    return ordered 
+
+def merge(results, gap):
+    """Combine the (filepath, result) of every chunk in file order"""
+    summary = {"lines": 0, "bytes": 0, "errors": 0, "error_samples": [], "indices": Counter(), "types": defaultdict(Counter), 
+               "coverage": {}}
+    files = {} #filepath -> sensor -> coverage of the chunks read so far 
+    for filepath, result in results:
+        for key in ("lines", "bytes", "errors"):
+            summary[key] += result[key]
+        summary["error_samples"].extend(result["error_samples"])
+        summary["indices"].update(result["indices"])
+        for kind, counts in result["types"].items():
+            summary["types"][kind].update(counts)
+
+        #Records of a sensor have to stay in time order across the chunks of a file 
+        sensors = files.setdefault(filepath, {})
+        for sensor, coverage in result["coverage"].items():
+            if sensor not in sensors:
+                sensors[sensor] = coverage 
+            elif not follow(sensors[sensor], coverage, gap):
+                summary["errors"] += 1
+                summary["error_samples"].append((filepath, coverage["offset"], f"{sensor} record is earlier than the previous record of the sensor"))
+
+    #Files can be passed in any order. Their coverage is joined by start time 
+    for sensors in files.values():
+        for sensor, coverage in sensors.items():
+            summary["coverage"].setdefault(sensor, []).append(coverage)
+    for sensor, parts in summary["coverage"].items():
+        parts.sort(key=lambda part: part["start"])
+        end = max(part["end"] for part in parts)
+        for part in parts[1:]:
+            follow(parts[0], part, gap)
+        parts[0]["end"] = end 
+        summary["coverage"][sensor] = {key: parts[0][key] for key in ("start", "end", "seconds", "gaps")}
+    summary["coverage"] = dict(sorted(summary["coverage"].items()))
+    summary["error_samples"].sort()
+    return summary 
+
+def format_time(epoch):
+    import time 
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="MDX Validator", description="Validates every line of ELK dumps against the MDX schema in parallel and reports counts and timestamp coverage")
+    parser.add_argument('-f', "--filepaths", nargs="+", required=True, type=str, help="Filepaths to ELK dumps with MDX data. Accepts multiple files.")
+    parser.add_argument('-w', "--workers", required=False, type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('-c', "--chunk_size", required=False, type=int, default=64, help="Size in MB of the chunks validated by each worker")
+    parser.add_argument("--gap", required=False, type=int, default=10, help="Report gaps between records of a sensor longer than this many seconds")
+    parser.add_argument("--max_errors", required=False, type=int, default=100, help="Number of schema errors to print")
+    parser.add_argument('-o', "--output", required=False, type=str, default=None, help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    tasks = []
+    for filepath in args.filepaths:
+        tasks.extend((filepath, start, end, args.max_errors, args.gap) for start, end in chunk_bounds(filepath, args.chunk_size * 2**20))
+
+    with Pool(args.workers) as pool, tqdm(total=sum(task[2] - task[1] for task in tasks), unit="B", unit_scale=True) as progress:
+        results = []
+        for (filepath, *_), result in zip(tasks, pool.imap(validate_chunk, tasks)):
+            result["error_samples"] = [(filepath, offset, message) for offset, message in result["error_samples"]]
+            results.append((filepath, result))
+            progress.update(result["bytes"])
+    summary = merge(results, args.gap)
+    sensors = summary["coverage"]
+
+    for filepath, offset, message in summary["error_samples"][:args.max_errors]:
+        print(f"{filepath}:{offset}: {message}")
+    print(f"{summary['lines']} lines, {summary['errors']} errors")
+    print("Records per index:")
+    for index, count in sorted(summary["indices"].items()):
+        print(f"  {index}: {count}")
+    print("Objects per type:")
+    for kind, counts in sorted(summary["types"].items()):
+        print(f"  {kind}: " + ", ".join(f"{name}={count}" for name, count in counts.most_common()))
+    print(f"Timestamp coverage (gaps longer than {args.gap} s):")
+    for sensor, report in sensors.items():
+        gaps = ", ".join(f"{format_time(a)} to {format_time(b)}" for a, b in report["gaps"][:5])
+        more = f" and {len(report['gaps']) - 5} more" if len(report["gaps"]) > 5 else ""
+        print(f"  {sensor}: {format_time(report['start'])} to {format_time(report['end'])}, {len(report['gaps'])} gaps" + (f": {gaps}{more}" if gaps else ""))
+
+    if args.output:
+        with open(args.output, "w+") as f:
+            json.dump({"lines": summary["lines"], "errors": summary["errors"], 
+                       "error_samples": [{"file": file, "offset": offset, "message": message} for file, offset, message in summary["error_samples"]],
+                       "indices": summary["indices"], "types": summary["types"], "coverage": sensors}, f, indent=2)
+    sys.exit(1 if summary["errors"] else 0)